@@ -0,0 +1,191 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawler import USER_AGENT, CrawlEngine, create_session
+from downloader import DownloadEngine, DownloadJob
+from link_extractor import DEFAULT_EXTRACTOR, EXTRACTORS
+from politeness import HostScheduler
+from traps import TrapDetector
+from synthetic_site import add_shape_arguments, serve, shape_from_args
+
+
+class TimedCrawlEngine(CrawlEngine):
+    # Keeps every fetch latency so percentiles are exact rather than bucketed, and counts the
+    # body bytes actually read, since asset sizes only come from a HEAD request's Content-Length
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self.bytes_read = 0
+
+    def timed_fetch(self, url, cached):
+        result = super().timed_fetch(url, cached)
+        self.latencies.append(result.latency)
+        self.bytes_read += result.transferred
+        return result
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def cpu_time():
+    # Children covers the parse pool workers once they have exited, and excludes the site's process until it does
+    return sum(usage.ru_utime + usage.ru_stime
+               for usage in (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def start_server(shape):
+    # The site runs in its own process so its CPU time is not charged to the crawler
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=serve, args=(shape, sender), daemon=True)
+    process.start()
+    port = receiver.recv()
+    return process, f"http://127.0.0.1:{port}/"
+
+
+def run_crawl(base_url, args):
+    results = []
+    session = create_session(args.workers)
+    # Starts at the full rate; the default politeness cap would hide engine changes behind it
+    scheduler = HostScheduler(session, USER_AGENT, args.per_host, rate=args.max_rate, max_rate=args.max_rate,
+                              respect_robots=False)
+    engine = TimedCrawlEngine(
+        base_url,
+        on_result=lambda record: results.append((record.url, record.content_type, record.size)),
+        max_workers=args.workers,
+        session=session,
+        scheduler=scheduler,
+        probe_assets=not args.no_probe,
+        link_extractor=args.extractor,
+        parse_workers=args.parse_workers,
+        traps=TrapDetector() if args.traps else None,
+    )
+    cpu_start, start = cpu_time(), time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - start
+    if engine.parse_pool is not None:
+        engine.parse_pool.executor.shutdown(wait=True)  # Reaped workers are what RUSAGE_CHILDREN counts
+    cpu = cpu_time() - cpu_start
+    pages = sum(1 for _, content_type, _ in results if 'text/html' in content_type)
+    return {
+        'results': len(results),
+        'pages': pages,
+        'errors': sum(1 for _, content_type, _ in results if content_type.startswith('Error')),
+        'seconds': elapsed,
+        'cpu_seconds': cpu,
+        'pages_per_sec': pages / elapsed,
+        'results_per_sec': len(results) / elapsed,
+        'bytes_per_sec': engine.bytes_read / elapsed,
+        'fetch_p50_ms': percentile(engine.latencies, 0.5) * 1000,
+        'fetch_p99_ms': percentile(engine.latencies, 0.99) * 1000,
+    }, [url for url, content_type, _ in results if content_type.startswith('image/')]
+
+
+def run_download(urls, args):
+    directory = tempfile.mkdtemp(prefix='bench_download_')
+    try:
+        jobs = [DownloadJob(url, os.path.join(directory, f"{i}.jpg")) for i, url in enumerate(urls)]
+        engine = DownloadEngine(max_parallel=args.download_parallel, segments=args.download_segments)
+        cpu_start, start = cpu_time(), time.perf_counter()
+        successful, failed = engine.download_all(jobs)
+        elapsed, cpu = time.perf_counter() - start, cpu_time() - cpu_start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'files': len(successful),
+        'failed': len(failed),
+        'seconds': elapsed,
+        'cpu_seconds': cpu,
+        'bytes_per_sec': engine.bytes_downloaded / elapsed,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawl engine against a local synthetic site")
+    add_shape_arguments(parser)
+    parser.add_argument('--workers', type=int, default=16, help="Crawler worker threads")
+    parser.add_argument('--per-host', type=int, default=16, help="Concurrent requests to the site")
+    parser.add_argument('--max-rate', type=float, default=10_000.0, help="Requests per second allowed to the site")
+    parser.add_argument('--parse-workers', type=int, default=0, help="Parse processes, 0 parses on the fetch threads")
+    parser.add_argument('--extractor', default=DEFAULT_EXTRACTOR, choices=sorted(EXTRACTORS))
+    parser.add_argument('--traps', action='store_true', help="Run crawler trap and duplicate content detection")
+    parser.add_argument('--no-probe', action='store_true', help="Do not HEAD assets for their size")
+    parser.add_argument('--download', type=int, default=0, metavar='N', help="Also download the first N images found")
+    parser.add_argument('--download-parallel', type=int, default=4)
+    parser.add_argument('--download-segments', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=1, help="Crawls to run, the best one is reported")
+    parser.add_argument('--output', default='bench_results.jsonl', help="File the run is appended to as one JSON line")
+    parser.add_argument('--label', default='', help="Free text stored with the run")
+    args = parser.parse_args()
+
+    shape = shape_from_args(args)
+    server, base_url = start_server(shape)
+    try:
+        print(f"Site: {shape.page_count()} pages, {shape.asset_count()} assets at {base_url}")
+        rounds = []
+        for i in range(max(1, args.rounds)):
+            crawl, images = run_crawl(base_url, args)
+            rounds.append(crawl)
+            print(f"round {i + 1}: {crawl['pages']} pages in {crawl['seconds']:.2f}s, "
+                  f"{crawl['pages_per_sec']:.1f} pages/sec, p50 {crawl['fetch_p50_ms']:.1f} ms, p99 {crawl['fetch_p99_ms']:.1f} ms")
+        download = run_download(images[:args.download], args) if args.download else None
+    finally:
+        server.terminate()
+
+    best = max(rounds, key=lambda crawl: crawl['pages_per_sec'])
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'label': args.label,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {name: value for name, value in vars(args).items() if name not in ('output', 'label')},
+        'crawl': best,
+        'rounds': rounds,
+        'download': download,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+    print(f"{'pages/sec':<14}{best['pages_per_sec']:.1f}")
+    print(f"{'MB/sec':<14}{best['bytes_per_sec'] / (1024 * 1024):.2f}")
+    print(f"{'CPU seconds':<14}{best['cpu_seconds']:.2f}")
+    print(f"{'fetch p50':<14}{best['fetch_p50_ms']:.1f} ms")
+    print(f"{'fetch p99':<14}{best['fetch_p99_ms']:.1f} ms")
+    print(f"{'peak RSS':<14}{record['peak_rss_mb']:.1f} MB")
+    if download:
+        print(f"{'download':<14}{download['files']} files, {download['bytes_per_sec'] / (1024 * 1024):.2f} MB/sec")
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from link_extractor import EXTRACTORS, get_extractor
+
+
+def load_corpus(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '**', '*.htm*'), recursive=True)):
+        with open(path, 'rb') as f:
+            # Saved pages are resolved against a fake URL that keeps their relative path
+            pages.append(('http://corpus.local/' + os.path.relpath(path, directory).replace(os.sep, '/'), f.read()))
+    return pages
+
+
+def synthetic_corpus(count=200, seed=0):
+    rng = random.Random(seed)
+    pages = []
+    for i in range(count):
+        parts = ['<!DOCTYPE html><html><head><title>Page %d</title>' % i,
+                 '<link rel="stylesheet" href="/css/site.css"><script src="/js/app.js"></script></head><body>']
+        if i % 10 == 0:
+            parts.append('<base href="/mirror/">')
+        for j in range(rng.randint(20, 200)):
+            parts.append('<div class="item"><p>%s</p><a href="page%d.html#s%d">link</a>' % ('lorem ipsum ' * rng.randint(5, 40), rng.randrange(count), j))
+            if j % 7 == 0:
+                parts.append('<img src="/img/%d.png" alt="">' % rng.randrange(500))
+            parts.append('</div>')
+        parts.append('</body></html>')
+        pages.append(('http://synthetic.local/section/page%d.html' % i, ''.join(parts).encode('utf-8')))
+    return pages
+
+
+def run_backend(name, pages, rounds):
+    extractor = get_extractor(name)
+    total_bytes = sum(len(body) for _, body in pages) * rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url, body in pages:
+            extractor.extract(url, body)
+    elapsed = time.perf_counter() - start
+    return len(pages) * rounds / elapsed, total_bytes / elapsed / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark link extractor backends")
+    parser.add_argument('corpus', nargs='?', help="Directory of saved .html pages (a synthetic corpus is used if omitted)")
+    parser.add_argument('--rounds', type=int, default=3, help="Passes over the corpus per backend")
+    parser.add_argument('--backends', default=','.join(EXTRACTORS), help="Comma separated backend names")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not pages:
+        sys.exit(f"No .html pages found in {args.corpus}")
+    backends = args.backends.split(',')
+    print(f"{len(pages)} pages, {sum(len(body) for _, body in pages) / (1024 * 1024):.1f} MB")
+
+    # Every backend has to agree with the BeautifulSoup reference before its speed means anything
+    reference = get_extractor('soup')
+    for name in backends:
+        extractor = get_extractor(name)
+        mismatches = sum(1 for url, body in pages if extractor.extract(url, body) != reference.extract(url, body))
+        if mismatches:
+            print(f"warning: {name} differs from soup on {mismatches} page(s)")
+
+    print(f"{'backend':<10}{'pages/sec':>12}{'MB/sec':>10}")
+    for name in backends:
+        pages_per_sec, mb_per_sec = run_backend(name, pages, args.rounds)
+        print(f"{name:<10}{pages_per_sec:>12.1f}{mb_per_sec:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
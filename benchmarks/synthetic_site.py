@@ -0,0 +1,175 @@
+import argparse
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_PATH = re.compile(r'^/page/(\d+)\.html$')
+ASSET_PATH = re.compile(r'^/assets/(\d+)-(\d+)\.jpg$')
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+FILLER = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor. '
+
+
+class SiteShape:
+    # A deterministic site: pages form a tree with `fanout` children each, cut off at `depth`
+    # levels or `pages` pages, whichever comes first. Every page also links a few random pages
+    # and carries `assets_per_page` images of `asset_size` bytes.
+    def __init__(self, pages=1000, fanout=10, depth=6, page_size=20_000, assets_per_page=2, asset_size=50_000,
+                 cross_links=5, latency=0.0, error_rate=0.0, seed=0):
+        self.fanout = max(1, fanout)
+        self.depth = max(0, depth)
+        self.page_size = page_size
+        self.assets_per_page = assets_per_page
+        self.asset_size = asset_size
+        self.cross_links = cross_links
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+
+        # Page i has children i * fanout + 1 .. i * fanout + fanout, so level d ends at the
+        # sum of fanout ** k for k <= d
+        reachable, level = 0, 1
+        for _ in range(self.depth + 1):
+            reachable += level
+            level *= self.fanout
+            if reachable >= pages:
+                break
+        self.pages = min(pages, reachable)
+        self.asset_body = b'\xff' * asset_size
+
+    def page_count(self):
+        return self.pages
+
+    def asset_count(self):
+        return self.pages * self.assets_per_page
+
+    def children(self, index):
+        first = index * self.fanout + 1
+        return range(first, min(first + self.fanout, self.pages))
+
+    def render_page(self, index):
+        rng = random.Random(self.seed * 1_000_003 + index)
+        links = list(self.children(index))
+        links += [rng.randrange(self.pages) for _ in range(self.cross_links)]
+        parts = [f'<!DOCTYPE html><html><head><title>Page {index}</title></head><body><h1>Page {index}</h1>']
+        for child in links:
+            parts.append(f'<p>{FILLER}<a href="/page/{child}.html">page {child}</a></p>')
+        for asset in range(self.assets_per_page):
+            parts.append(f'<img src="/assets/{index}-{asset}.jpg" alt="">')
+        size = sum(len(part) for part in parts)
+        if size < self.page_size:
+            parts.append('<p>' + FILLER * ((self.page_size - size) // len(FILLER) + 1) + '</p>')
+        parts.append('</body></html>')
+        return ''.join(parts).encode('utf-8')
+
+
+def make_handler(shape):
+    errors = random.Random(shape.seed)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, as real sites do
+
+        def do_HEAD(self):
+            self.respond(head=True)
+
+        def do_GET(self):
+            self.respond(head=False)
+
+        def respond(self, head):
+            if shape.latency:
+                time.sleep(shape.latency)
+            if shape.error_rate and errors.random() < shape.error_rate:
+                return self.send_body(503, 'text/plain', b'Try again', head, {'Retry-After': '1'})
+
+            path = self.path.split('?', 1)[0]
+            if path == '/':
+                path = '/page/0.html'
+            match = PAGE_PATH.match(path)
+            if match and int(match.group(1)) < shape.pages:
+                return self.send_body(200, 'text/html; charset=utf-8', shape.render_page(int(match.group(1))), head)
+            match = ASSET_PATH.match(path)
+            if match and int(match.group(1)) < shape.pages and int(match.group(2)) < shape.assets_per_page:
+                return self.send_asset(head)
+            self.send_body(404, 'text/plain', b'Not found', head)
+
+        def send_asset(self, head):
+            body, status, headers = shape.asset_body, 200, {'Accept-Ranges': 'bytes'}
+            match = RANGE_HEADER.match(self.headers.get('Range', ''))
+            if match and (match.group(1) or match.group(2)):
+                total = len(body)
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), total - 1) if match.group(2) else total - 1
+                else:
+                    start, end = max(0, total - int(match.group(2))), total - 1
+                if start >= total or start > end:
+                    return self.send_body(416, 'text/plain', b'', head, {'Content-Range': f'bytes */{total}'})
+                body, status = body[start:end + 1], 206
+                headers['Content-Range'] = f'bytes {start}-{end}/{total}'
+            self.send_body(status, 'image/jpeg', body, head, headers)
+
+        def send_body(self, status, content_type, body, head, headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def create_server(shape, host='127.0.0.1', port=0):
+    server = ThreadingHTTPServer((host, port), make_handler(shape))
+    server.daemon_threads = True
+    server.request_queue_size = 256
+    return server
+
+
+def serve(shape, connection):
+    # Process entry point for the benchmark: reports the bound port, then serves until killed
+    server = create_server(shape)
+    connection.send(server.server_address[1])
+    connection.close()
+    server.serve_forever()
+
+
+def add_shape_arguments(parser):
+    parser.add_argument('--pages', type=int, default=1000, help="Most pages in the site")
+    parser.add_argument('--fanout', type=int, default=10, help="Child pages linked from each page")
+    parser.add_argument('--depth', type=int, default=6, help="Levels below the home page")
+    parser.add_argument('--page-size', type=int, default=20_000, help="Approximate HTML bytes per page")
+    parser.add_argument('--assets-per-page', type=int, default=2, help="Images linked from each page")
+    parser.add_argument('--asset-size', type=int, default=50_000, help="Bytes per image")
+    parser.add_argument('--cross-links', type=int, default=5, help="Extra links from each page to random pages")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def shape_from_args(args):
+    return SiteShape(args.pages, args.fanout, args.depth, args.page_size, args.assets_per_page, args.asset_size,
+                     args.cross_links, args.latency, args.error_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic site for crawl benchmarks")
+    parser.add_argument('--port', type=int, default=8000)
+    add_shape_arguments(parser)
+    args = parser.parse_args()
+    shape = shape_from_args(args)
+    server = create_server(shape, port=args.port)
+    print(f"Serving {shape.page_count()} pages and {shape.asset_count()} assets on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
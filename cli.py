@@ -0,0 +1,159 @@
+import argparse
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+from crawl_state import read_saved_crawl
+from crawler import crawl
+from distributed import crawl_distributed, parse_address
+from downloader import DownloadEngine, DownloadJob, unique_save_path
+from link_extractor import DEFAULT_EXTRACTOR, EXTRACTORS
+from results import FILE_TYPES, NOT_DOWNLOADABLE, classify
+from sinks import FORMATS, open_sink
+from traps import TrapDetector
+
+
+class TextSink:
+    # Human readable lines on stdout, same interface as the file sinks
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, record):
+        self.out.write(f"{classify(record.content_type):<11}{record.size:>12}  {record.url}\n")
+
+    def maybe_flush(self):
+        self.out.flush()
+
+    def close(self):
+        self.out.flush()
+
+
+def download_files(urls, directory, args):
+    os.makedirs(directory, exist_ok=True)
+    jobs, taken = [], set()
+    for url in urls:
+        filename = os.path.basename(urlparse(url).path) or "index.html"
+        jobs.append(DownloadJob(url, unique_save_path(directory, filename, taken)))
+    engine = DownloadEngine(max_parallel=args.download_parallel)
+    successful, failed = engine.download_all(jobs)
+    for job in failed:
+        print(f"Failed: {job.url} ({job.error})", file=sys.stderr)
+    print(f"Downloaded {len(successful)} file(s) to {directory}, {len(failed)} failed", file=sys.stderr)
+    return not failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl a website and list every file it hosts")
+    parser.add_argument('url', nargs='?', help="Website to crawl (optional with --resume)")
+    parser.add_argument('-w', '--workers', type=int, default=16, help="Concurrent requests overall")
+    parser.add_argument('--per-host', type=int, default=4, help="Most concurrent requests to one host")
+    parser.add_argument('-d', '--depth', type=int, default=100,
+                        help="Follow links at most this many clicks from the start page (default 100), 0 for no limit")
+    parser.add_argument('-f', '--format', choices=('text',) + FORMATS,
+                        help="Output format (default: text on stdout, or from the --output extension)")
+    parser.add_argument('-o', '--output', help="Stream results to this file instead of stdout")
+    parser.add_argument('--no-traps', action='store_true', help="Follow crawler traps and duplicate pages instead of skipping them")
+    parser.add_argument('--pattern-budget', type=int, default=0,
+                        help="Most URLs per pattern (digits and query values ignored) before the rest are skipped, 0 for no limit (default)")
+    parser.add_argument('--no-robots', action='store_true', help="Ignore robots.txt")
+    parser.add_argument('--sitemaps', action='store_true', help="Seed the crawl from the site's sitemaps")
+    parser.add_argument('--no-probe', action='store_true', help="Guess asset types from the extension instead of a HEAD request")
+    parser.add_argument('--parse-workers', type=int, default=0, help="Processes for HTML parsing, 0 parses on the fetch threads")
+    parser.add_argument('--extractor', choices=sorted(EXTRACTORS), default=DEFAULT_EXTRACTOR, help="Link extractor backend")
+    parser.add_argument('--state', help="SQLite file that keeps the crawl so it can be resumed")
+    parser.add_argument('--resume', action='store_true', help="Continue the crawl saved in --state")
+    parser.add_argument('--cache', help="SQLite file of ETag/Last-Modified validators for conditional re-crawls")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Crawl with this many worker processes, each owning a share of the URLs")
+    parser.add_argument('--partition', choices=('url', 'host'), default='url',
+                        help="Split work between processes by URL, sharing each host's --per-host limit and rate between them, "
+                             "or keep each host on one process (faster on crawls of many hosts)")
+    parser.add_argument('--listen', metavar='HOST:PORT',
+                        help="Let workers on other machines join; start them with `python distributed.py HOST:PORT --authkey KEY`")
+    parser.add_argument('--authkey', help="Shared secret for workers joining with --listen")
+    parser.add_argument('--download', metavar='DIR', help="Download the files found into DIR after the crawl")
+    parser.add_argument('--download-type', action='append', choices=FILE_TYPES,
+                        help="Only download files of this type (repeatable, default all but HTML, errors and skipped URLs)")
+    parser.add_argument('--download-parallel', type=int, default=4, help="Files downloaded at once")
+    args = parser.parse_args(argv)
+    if args.resume and not args.state:
+        parser.error("--resume needs --state")
+    if not args.url and not args.resume:
+        parser.error("a URL is required unless resuming")
+    if args.format == 'sqlite' and not args.output:
+        parser.error("--format sqlite needs --output")
+    if args.listen and not args.authkey:
+        parser.error("--listen needs --authkey")
+    if args.processes > 1 and (args.state or args.cache):
+        parser.error("--state and --cache are not available with --processes")
+    if args.format == 'text' and args.output:
+        parser.error("--format text is for stdout, pick jsonl, csv or sqlite for --output")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    url = args.url
+    if args.resume:
+        url = read_saved_crawl(args.state) or url
+        if not url:
+            sys.exit(f"There is no saved crawl in {args.state}")
+    if not url.startswith(('http://', 'https://')):
+        url = 'http://' + url
+
+    download_types = set(args.download_type) if args.download_type else set(FILE_TYPES) - {'HTML'} - NOT_DOWNLOADABLE
+    to_download = []
+    if args.output:
+        try:
+            sink = open_sink(args.output, args.format)
+        except ValueError as e:
+            sys.exit(str(e))
+    elif args.format in (None, 'text'):
+        sink = TextSink(sys.stdout)
+    else:
+        sink = open_sink(sys.stdout, args.format, batch_size=1)
+    start = time.monotonic()
+    count = 0
+    options = dict(
+        max_workers=args.workers,
+        per_host_limit=args.per_host,
+        max_depth=args.depth or None,  # The cap is what stops traps whose URLs and pages all differ, like an endless calendar
+        respect_robots=not args.no_robots,
+        use_sitemaps=args.sitemaps,
+        probe_assets=not args.no_probe,
+        parse_workers=args.parse_workers,
+        link_extractor=args.extractor,
+        traps=None if args.no_traps else TrapDetector(pattern_budget=args.pattern_budget or None),
+        on_tick=sink.maybe_flush,  # Buffered rows still reach the file while the crawl waits on a slow host
+    )
+
+    def handle(record):
+        nonlocal count
+        sink.write(record)
+        count += 1
+        if args.download and classify(record.content_type) in download_types:
+            to_download.append(record.url)
+
+    try:
+        if args.processes > 1 or args.listen:
+            distributed = dict(workers=args.processes, partition_by=args.partition)
+            if args.listen:
+                # Every worker joins over the network, none are started here
+                distributed.update(address=parse_address(args.listen), authkey=args.authkey.encode('utf-8'), spawn=False)
+            crawl_distributed(url, handle, **distributed, **options)
+        else:
+            crawl(url, handle, state_path=args.state, cache_path=args.cache, resume=args.resume, **options)
+    except KeyboardInterrupt:
+        print("Stopped", file=sys.stderr)
+    finally:
+        sink.close()
+    print(f"Found {count} files/pages in {time.monotonic() - start:.1f}s", file=sys.stderr)
+
+    if args.download and to_download:
+        return 0 if download_files(to_download, args.download, args) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS frontier (id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, depth INTEGER NOT NULL DEFAULT 0, referrer TEXT);
+CREATE TABLE IF NOT EXISTS seen (fp INTEGER PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS results (url TEXT PRIMARY KEY, content_type TEXT, size INTEGER, status INTEGER, depth INTEGER, referrer TEXT, skipped TEXT);
+"""
+
+# Columns added since the first version of the schema, added on open to older state files
+ADDED_COLUMNS = {
+    'frontier': [('depth', 'INTEGER NOT NULL DEFAULT 0'), ('referrer', 'TEXT')],
+    'results': [('status', 'INTEGER'), ('depth', 'INTEGER'), ('referrer', 'TEXT'), ('skipped', 'TEXT')],
+}
+
+
+def to_signed(fp):
+    # SQLite integers are signed 64-bit, fingerprints are unsigned
+    return fp - (1 << 64) if fp >= (1 << 63) else fp
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def read_saved_crawl(path):
+    # Returns the base URL of a crawl that can be resumed, or None
+    if not os.path.exists(path):
+        return None
+    try:
+        conn = sqlite3.connect(path)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'base_url'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+class CrawlState:
+    # On-disk copy of the frontier, seen fingerprints and results so a crawl can be resumed.
+    # Writes are buffered and committed in batches; use from a single thread.
+    def __init__(self, path, batch_size=500, flush_interval=2.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        with self.conn:
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+                for name, definition in columns:
+                    if name not in existing:
+                        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.added = []
+        self.finished = []
+
+    def base_url(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'base_url'").fetchone()
+        return row[0] if row else None
+
+    def reset(self, base_url):
+        self.added.clear()
+        self.finished.clear()
+        with self.conn:
+            for table in ('meta', 'frontier', 'seen', 'results'):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('base_url', ?)", (base_url,))
+
+    def seen_fingerprints(self):
+        for (fp,) in self.conn.execute("SELECT fp FROM seen"):
+            yield to_unsigned(fp)
+
+    def pending_urls(self):
+        # (url, depth, referrer), including URLs that were in flight when the crawl stopped
+        yield from self.conn.execute("SELECT url, depth, referrer FROM frontier ORDER BY id")
+
+    def results(self):
+        yield from self.conn.execute("SELECT url, content_type, size, status, depth, referrer, skipped FROM results")
+
+    def record_added(self, url, fp, depth=0, referrer=None):
+        self.added.append((url, to_signed(fp), depth, referrer))
+        self.maybe_flush()
+
+    def record_result(self, url, content_type, size, status=None, depth=None, referrer=None, skipped=None):
+        self.finished.append((url, content_type, size, status, depth, referrer, skipped))
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if (len(self.added) + len(self.finished) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.added and not self.finished:
+            return
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO seen (fp) VALUES (?)", ((fp,) for _, fp, _, _ in self.added))
+            self.conn.executemany("INSERT OR IGNORE INTO frontier (url, depth, referrer) VALUES (?, ?, ?)",
+                                  ((url, depth, referrer) for url, _, depth, referrer in self.added))
+            self.conn.executemany("INSERT OR REPLACE INTO results (url, content_type, size, status, depth, referrer, skipped) "
+                                  "VALUES (?, ?, ?, ?, ?, ?, ?)", self.finished)
+            self.conn.executemany("DELETE FROM frontier WHERE url = ?", ((row[0],) for row in self.finished))
+        self.added.clear()
+        self.finished.clear()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
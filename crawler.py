@@ -0,0 +1,484 @@
+import heapq
+import mimetypes
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from crawl_state import CrawlState
+from frontier import TRACKING_PARAMS, Frontier, fingerprint
+from http_cache import ValidatorCache
+from link_extractor import DEFAULT_EXTRACTOR, get_extractor
+from parse_pool import ParsePool
+from sitemaps import iter_sitemap_urls, robots_sitemaps
+from politeness import HostScheduler, RETRY_STATUSES, backoff_delay, parse_retry_after
+from metrics import instrument_session
+from traps import SESSION_PARAMS, content_fingerprint
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Extensions that are never HTML, so their bodies are never worth downloading during discovery
+ASSET_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.svg', '.ico', '.tif', '.tiff', '.avif',
+    '.mp4', '.webm', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.m4v',
+    '.mp3', '.wav', '.ogg', '.flac', '.aac', '.m4a',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt',
+    '.zip', '.rar', '.7z', '.gz', '.tgz', '.bz2', '.xz', '.tar', '.iso', '.dmg', '.exe', '.msi', '.apk', '.bin',
+    '.css', '.js', '.mjs', '.json', '.xml', '.txt', '.csv', '.map',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot',
+}
+
+
+def same_domain(url1, url2):
+    try:
+        return urlparse(url1).netloc == urlparse(url2).netloc
+    except:
+        return False
+
+
+def is_asset_url(url):
+    return os.path.splitext(urlparse(url).path)[1].lower() in ASSET_EXTENSIONS
+
+
+def content_length(response):
+    try:
+        return int(response.headers.get('content-length', 0))
+    except ValueError:
+        return 0
+
+
+class FetchResult:
+    __slots__ = ('status', 'content_type', 'size', 'links', 'etag', 'last_modified', 'not_modified', 'retry_after',
+                 'latency', 'disallowed', 'body', 'encoding', 'fingerprint', 'transferred')
+
+    def __init__(self, status, content_type, size, links=(), etag=None, last_modified=None, not_modified=False):
+        self.status = status
+        self.content_type = content_type
+        self.size = size
+        self.links = links
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified  # Answered 304, links and size come from the validator cache
+        self.retry_after = None
+        self.latency = 0.0
+        self.disallowed = False  # Excluded by robots.txt, nothing was requested
+        self.body = None  # Raw HTML left for the parse pool, links are filled in once it is parsed
+        self.encoding = None
+        self.fingerprint = None  # (exact, simhash) of the page text when duplicate detection is on
+        self.transferred = 0  # Body bytes actually read; size may only be a Content-Length
+
+
+class CrawlRecord:
+    # One finished URL as handed to on_result; skipped says why it was not fetched or not followed
+    __slots__ = ('url', 'content_type', 'size', 'status', 'depth', 'referrer', 'skipped')
+
+    def __init__(self, url, content_type, size, status=None, depth=None, referrer=None, skipped=None):
+        self.url = url
+        self.content_type = content_type
+        self.size = size
+        self.status = status
+        self.depth = depth
+        self.referrer = referrer
+        self.skipped = skipped
+
+
+def create_session(pool_size=10):
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    # One pool slot per worker so concurrent requests reuse connections instead of opening new ones
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class CrawlEngine:
+    def __init__(self, base_url, on_result, max_workers=16, per_host_limit=4, is_running=None, session=None,
+                 probe_assets=True, link_extractor=DEFAULT_EXTRACTOR, frontier=None,
+                 state=None, resume=False, cache=None, respect_robots=True, max_retries=3, scheduler=None,
+                 parse_workers=0, use_sitemaps=False, metrics=None, max_depth=None, traps=None, on_tick=None,
+                 host_share=1.0):
+        self.on_result = on_result
+        self.max_workers = max(1, max_workers)
+        self.is_running = is_running or (lambda: True)
+        self.session = session or create_session(self.max_workers)
+        self.metrics = metrics  # Optional CrawlMetrics, None keeps the hot path free of timing calls
+        if metrics is not None:
+            instrument_session(self.session, metrics)
+        self.probe_assets = probe_assets  # False trusts the file extension and skips the HEAD request
+        self.link_extractor = get_extractor(link_extractor)
+        self.link_extractor_name = link_extractor
+        self.parse_workers = parse_workers  # Processes for HTML parsing, 0 parses on the fetch threads
+        self.parse_pool = None
+        self.use_sitemaps = use_sitemaps  # Seed the frontier from robots.txt/sitemap.xml before following links
+        self.max_depth = max_depth  # Links of pages at this depth are not followed, None follows everything
+        self.origins = {}  # url -> (depth, referrer) from leaving the frontier until reported, pending ones keep theirs in the frontier
+        self.poll_interval = 0.5  # Longest wait for a fetch before the loop checks is_running again
+        self.on_tick = on_tick  # Called on every pass of the loop, busy or idle, e.g. a sink's maybe_flush
+
+        self.traps = traps  # Optional TrapDetector for crawler traps and duplicate pages
+        if frontier is None:
+            frontier = Frontier(TRACKING_PARAMS | SESSION_PARAMS if traps is not None else TRACKING_PARAMS)
+        self.frontier = frontier
+        self.base_url = self.frontier.canonicalize(base_url)
+        # Per-host rate, concurrency and robots.txt; replaces the old fixed sleep between requests
+        self.scheduler = scheduler or HostScheduler(self.session, USER_AGENT, per_host_limit, respect_robots=respect_robots,
+                                                    share=host_share)
+        self.max_retries = max_retries
+        self.attempts = {}  # url -> failed attempts so far
+        self.retries = []  # heap of (due time, url)
+        self.state = state  # Optional CrawlState that mirrors progress to disk
+        self.resume = resume
+        self.cache = cache  # Optional ValidatorCache for conditional re-crawls
+
+    def add(self, url, depth=0, referrer=None):
+        if not self.frontier.mark_seen(url):
+            return
+        if self.state is not None:
+            self.state.record_added(url, fingerprint(url), depth, referrer)
+        reason = None
+        if self.max_depth is not None and depth > self.max_depth:
+            reason = f"more than {self.max_depth} links from the start page"
+        elif self.traps is not None:
+            reason = self.traps.check_url(url)
+        if reason is None:
+            self.enqueue(url, depth, referrer)
+        else:
+            self.skip(url, depth, referrer, reason)
+
+    def enqueue(self, url, depth, referrer):
+        # A new URL that passed every check; engines sharing a crawl may check it further first
+        self.frontier.push(url, depth, referrer)
+
+    def skip(self, url, depth, referrer, reason):
+        self.origins[url] = (depth, referrer)
+        self.report(url, f"Skipped: {reason}", 0, skipped=reason)
+
+    def restore(self):
+        # Rebuild the frontier from the saved state and replay results already found
+        for fp in self.state.seen_fingerprints():
+            self.frontier.seen.add(fp)
+        for url, depth, referrer in self.state.pending_urls():
+            self.frontier.push(url, depth, referrer)
+        for row in self.state.results():
+            self.on_result(CrawlRecord(*row))
+
+    def seed_from_sitemaps(self, chunk_size=10_000):
+        # Sitemaps are read as a stream and loaded in chunks; within a chunk the most
+        # recently modified pages go first
+        def load(chunk):
+            chunk.sort(key=lambda entry: entry[1] or '', reverse=True)
+            for url, _ in chunk:
+                self.add(url)
+
+        chunk = []
+        urls = iter_sitemap_urls(self.session, robots_sitemaps(self.session, self.base_url), is_running=self.is_running)
+        for url, lastmod in urls:
+            url = self.frontier.canonicalize(url)
+            if same_domain(url, self.base_url):
+                chunk.append((url, lastmod))
+                if len(chunk) >= chunk_size:
+                    load(chunk)
+                    chunk = []
+        load(chunk)
+
+    def report(self, url, content_type, size, status=None, skipped=None):
+        depth, referrer = self.origins.pop(url, (None, None))
+        self.on_result(CrawlRecord(url, content_type, size, status, depth, referrer, skipped))
+        if self.state is not None:
+            self.state.record_result(url, content_type, size, status, depth, referrer, skipped)
+
+    def retry(self, url, result=None):
+        # Returns False once the URL has used up its retries and should be reported as is
+        attempt = self.attempts.get(url, 0)
+        if attempt >= self.max_retries:
+            self.attempts.pop(url, None)
+            return False
+        self.attempts[url] = attempt + 1
+        delay = backoff_delay(attempt)
+        if result is not None and result.retry_after is not None:
+            delay = max(delay, result.retry_after)
+            self.scheduler.block(urlparse(url).netloc, result.retry_after)
+        heapq.heappush(self.retries, (time.monotonic() + delay, url))
+        return True
+
+    def requeue_due_retries(self):
+        now = time.monotonic()
+        while self.retries and self.retries[0][0] <= now:
+            url = heapq.heappop(self.retries)[1]
+            self.frontier.push(url, *self.origins.pop(url, (0, None)))
+
+    def timed_fetch(self, url, cached):
+        if not self.scheduler.allowed(url):
+            result = FetchResult(0, '', 0)
+            result.disallowed = True
+            return result
+        start = time.monotonic()
+        result = self.fetch(url, cached)
+        result.latency = time.monotonic() - start
+        if self.metrics is not None:
+            self.metrics.observe('fetch', result.latency)
+        return result
+
+    def fetch(self, url, cached=None):
+        if is_asset_url(url):
+            return self.probe(url)
+
+        # Stream so that only HTML bodies are pulled; anything else is closed after the headers
+        headers = cached.conditional_headers() if cached is not None else None
+        with self.session.get(url, timeout=10, stream=True, headers=headers) as response:
+            if self.metrics is not None:
+                # elapsed stops once the headers are parsed, before any of the body is read
+                self.metrics.observe('ttfb', response.elapsed.total_seconds())
+            if response.status_code == 304 and cached is not None:
+                return FetchResult(200, cached.content_type, cached.size, cached.links, not_modified=True)
+            if response.status_code in RETRY_STATUSES:
+                result = FetchResult(response.status_code, response.headers.get('content-type', '').lower(), content_length(response))
+                result.retry_after = parse_retry_after(response.headers.get('retry-after'))
+                return result
+
+            content_type = response.headers.get('content-type', '').lower()
+            etag = response.headers.get('etag')
+            last_modified = response.headers.get('last-modified')
+            if 'text/html' not in content_type:
+                return FetchResult(response.status_code, content_type, content_length(response), [], etag, last_modified)
+            if self.metrics is not None:
+                start = time.perf_counter()
+                body = response.content
+                self.metrics.observe('transfer', time.perf_counter() - start)
+            else:
+                body = response.content
+            # Only trust an explicit charset, otherwise let the extractor sniff or assume UTF-8
+            encoding = response.encoding if 'charset=' in content_type else None
+
+        result = FetchResult(response.status_code, content_type, len(body), [], etag, last_modified)
+        result.transferred = len(body)
+        if self.parse_pool is not None:
+            result.body, result.encoding = body, encoding
+            return result
+        start = time.perf_counter()
+        result.links = self.link_extractor.extract(url, body, encoding)
+        if self.traps is not None:
+            result.fingerprint = content_fingerprint(body, encoding)
+        if self.metrics is not None:
+            self.metrics.observe('parse', time.perf_counter() - start)
+        return result
+
+    def probe(self, url):
+        if not self.probe_assets:
+            return FetchResult(0, mimetypes.guess_type(url)[0] or '', 0)
+
+        response = self.session.head(url, timeout=10, allow_redirects=True)
+        if self.metrics is not None:
+            self.metrics.observe('ttfb', response.elapsed.total_seconds())
+        if response.status_code in (405, 501):
+            # Server refuses HEAD, fall back to a GET that stops after the headers
+            response = self.session.get(url, timeout=10, stream=True)
+            response.close()
+        return FetchResult(response.status_code, response.headers.get('content-type', '').lower(), content_length(response))
+
+    def remember(self, url, result):
+        if result.not_modified:
+            self.cache.touch(url)
+        elif result.status == 200 and (result.etag or result.last_modified):
+            self.cache.put(url, result.etag, result.last_modified, result.content_type, result.size, result.links)
+
+    def sync(self):
+        # Called on every pass of the dispatcher loop; engines sharing a crawl exchange URLs here
+        pass
+
+    def idle(self):
+        # Called when there is no local work left; returning False keeps the engine waiting for more
+        return True
+
+    def run(self):
+        if self.resume and self.state is not None and self.state.base_url():
+            self.restore()
+        else:
+            if self.state is not None:
+                self.state.reset(self.base_url)
+            self.add(self.base_url)
+            if self.use_sitemaps:
+                self.seed_from_sitemaps()
+
+        if self.parse_workers > 0:
+            self.parse_pool = ParsePool(self.base_url, self.parse_workers, self.link_extractor_name, self.frontier.strip_params,
+                                        metrics=self.metrics, fingerprint_content=self.traps is not None)
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        try:
+            while self.is_running():
+                if self.on_tick is not None:
+                    self.on_tick()
+                self.sync()
+                self.requeue_due_retries()
+                # Stop fetching while the parse pool is backed up, fetched pages would only pile up in memory
+                while len(pending) < self.max_workers and not (self.parse_pool is not None and self.parse_pool.full()):
+                    entry = self.frontier.pop(self.scheduler.ready)
+                    if entry is None:
+                        break
+                    url = entry[0]
+                    self.origins[url] = entry[1:]
+                    self.scheduler.acquire(urlparse(url).netloc)
+                    cached = self.cache.get(url) if self.cache is not None else None
+                    pending[pool.submit(self.timed_fetch, url, cached)] = url
+
+                parsing = self.parse_pool.futures() if self.parse_pool is not None else []
+                if not pending and not parsing:
+                    if not len(self.frontier) and not self.retries and not self.parse_pool and self.idle():
+                        break
+                    # Everything left is waiting on a rate limit, a retry backoff or a parse batch
+                    if self.parse_pool is not None:
+                        self.parse_pool.flush()
+                    time.sleep(0.01)
+                    continue
+
+                # Wake up periodically so a stop request is noticed even while requests hang,
+                # and often enough to hand out tokens as they refill
+                done, _ = wait(list(pending) + parsing, timeout=0.01 if len(self.frontier) or self.retries else self.poll_interval, return_when=FIRST_COMPLETED)
+                if self.state is not None:
+                    self.state.maybe_flush()
+                if self.metrics is not None:
+                    self.metrics.set_gauge('queue_depth', len(self.frontier))
+                    self.metrics.set_gauge('in_flight', len(pending))
+                    self.metrics.set_gauge('parse_backlog', len(self.parse_pool) if self.parse_pool is not None else 0)
+                for future in done:
+                    if future in pending:
+                        self.handle_fetch(pending.pop(future), future)
+                if self.parse_pool is not None:
+                    for (url, result), links, content, error in self.parse_pool.collect(done):
+                        if error is not None:
+                            self.report(url, f"Error: {error}", 0)
+                            continue
+                        result.links, result.fingerprint = links, content
+                        self.expand(url, result, canonical=True)
+                    # Send partial batches whenever a worker would otherwise sit idle
+                    if self.parse_pool.idle():
+                        self.parse_pool.flush()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+            if self.state is not None:
+                self.state.flush()
+            if self.cache is not None:
+                self.cache.flush()
+
+    def handle_fetch(self, url, future):
+        host = urlparse(url).netloc
+        self.scheduler.release(host)
+        try:
+            result = future.result()
+        except requests.RequestException as e:
+            self.scheduler.record(host, None, None)
+            if self.metrics is not None:
+                self.metrics.record_error(e)
+            transient = isinstance(e, (requests.ConnectionError, requests.Timeout))
+            if not transient or not self.retry(url):
+                self.report(url, f"Error: {str(e)}", 0)
+            return
+        except Exception as e:
+            # A page that cannot be parsed is one Error row, not the end of the crawl
+            if self.metrics is not None:
+                self.metrics.record_error(e)
+            self.report(url, f"Error: {str(e)}", 0)
+            return
+
+        if result.disallowed:
+            self.report(url, "Skipped: disallowed by robots.txt", 0, skipped="disallowed by robots.txt")
+            return
+        self.scheduler.record(host, result.latency, result.status)
+        if self.metrics is not None:
+            self.metrics.record_status(result.status)
+            self.metrics.add('pages')
+            self.metrics.add('bytes', result.transferred)
+        if result.status in RETRY_STATUSES and self.retry(url, result):
+            return
+        self.attempts.pop(url, None)
+
+        if result.body is not None:
+            body, result.body = result.body, None
+            self.parse_pool.add((url, result), url, body, result.encoding)
+        else:
+            self.expand(url, result)
+
+    def expand(self, url, result, canonical=False):
+        duplicate = None
+        if self.traps is not None and result.fingerprint is not None:
+            duplicate = self.traps.duplicate_of(*result.fingerprint)
+        self.follow(url, result, canonical, duplicate)
+
+    def follow(self, url, result, canonical=False, duplicate=None):
+        # Reported only once its links are known, so a saved crawl never has a finished page with lost outlinks
+        depth = self.origins.get(url, (0, None))[0] or 0
+        skipped = f"links not followed, {duplicate}" if duplicate is not None else None
+        self.report(url, result.content_type, result.size, result.status, skipped)
+        if self.cache is not None:
+            self.remember(url, result)
+        if skipped is not None:
+            return
+        for link in result.links:
+            if not canonical:
+                link = self.frontier.canonicalize(link)
+                if not same_domain(link, self.base_url):
+                    continue
+            self.add(link, depth + 1, url)
+
+
+def crawl(base_url, on_result, state_path=None, cache_path=None, **options):
+    # Runs a whole crawl on the calling thread. state_path keeps a resumable copy of the crawl
+    # and cache_path the ETag/Last-Modified validators; other options go to CrawlEngine.
+    state = CrawlState(state_path) if state_path else None
+    cache = ValidatorCache(cache_path) if cache_path else None
+    try:
+        CrawlEngine(base_url, on_result, state=state, cache=cache, **options).run()
+    finally:
+        if state is not None:
+            state.close()
+        if cache is not None:
+            cache.close()
+
+
+def iter_crawl(base_url, buffer_size=10_000, **options):
+    # Yields CrawlRecords as they are found while the crawl runs on a background thread.
+    # The crawl pauses when buffer_size records are waiting and stops when the iterator is closed.
+    records = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+    finished = object()
+    error = []
+    is_running = options.pop('is_running', None) or (lambda: True)
+
+    def deliver(item):
+        while not stopped.is_set():
+            try:
+                records.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run():
+        try:
+            crawl(base_url, deliver, is_running=lambda: not stopped.is_set() and is_running(), **options)
+        except BaseException as e:
+            error.append(e)
+        finally:
+            deliver(finished)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = records.get()
+            if item is finished:
+                break
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+    if error:
+        raise error[0]
@@ -0,0 +1,325 @@
+import argparse
+import copy
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener, wait
+from urllib.parse import urlsplit
+
+from crawler import CrawlEngine, CrawlRecord
+from frontier import FingerprintSet, fingerprint
+from traps import url_pattern
+
+
+def partition(url, workers, by='url'):
+    # Index of the worker that owns the URL. 'host' keeps each host, and its politeness limits,
+    # on one worker; 'url' spreads a single site over all of them
+    key = urlsplit(url).netloc if by == 'host' else url
+    return fingerprint(key) % workers
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class PartitionedCrawlEngine(CrawlEngine):
+    # One worker of a distributed crawl. It only fetches URLs of its own partition; links owned
+    # by other workers are sent to the coordinator in batches, which passes them on. Results
+    # are batched to the coordinator the same way. With traps on, the coordinator keeps the
+    # page fingerprints and pattern counts of the whole crawl: a fetched page waits for its
+    # duplicate verdict before its links are followed, and with a pattern budget a new URL
+    # waits for its count before it is queued.
+    def __init__(self, conn, worker_id, workers, base_url, partition_by='url', batch_size=500, flush_interval=0.2,
+                 shared_budget=False, **options):
+        self.conn = conn
+        self.worker_id = worker_id
+        self.workers = workers
+        self.partition_by = partition_by
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.shared_budget = shared_budget
+        self.last_flush = time.monotonic()
+        self.outbox = []  # (owner, url, depth, referrer) for other workers
+        self.forwarded = FingerprintSet()  # Each foreign URL is sent on only once
+        self.finished = []
+        self.tokens = itertools.count()
+        self.page_checks = []  # (token, exact, simhash) to ask the coordinator about
+        self.pattern_checks = []  # (token, pattern)
+        self.waiting = {}  # token -> arguments of follow() or enqueue() until the coordinator answers
+        self.received = 0
+        self.sent = 0
+        self.reported = None
+        self.stopped = False
+        super().__init__(base_url, self.finished_record, is_running=lambda: not self.stopped, **options)
+        self.poll_interval = 0.05  # Links from other workers should not wait long for a slow fetch
+
+    def finished_record(self, record):
+        self.finished.append((record.url, record.content_type, record.size, record.status, record.depth,
+                              record.referrer, record.skipped))
+
+    def add(self, url, depth=0, referrer=None):
+        owner = partition(url, self.workers, self.partition_by)
+        if owner == self.worker_id:
+            super().add(url, depth, referrer)
+        elif self.forwarded.add(fingerprint(url)):
+            self.outbox.append((owner, url, depth, referrer))
+
+    def enqueue(self, url, depth, referrer):
+        if not self.shared_budget:
+            return super().enqueue(url, depth, referrer)
+        token = next(self.tokens)
+        self.waiting[token] = (url, depth, referrer)
+        self.pattern_checks.append((token, url_pattern(url)))
+
+    def expand(self, url, result, canonical=False):
+        if self.traps is None or result.fingerprint is None:
+            return self.follow(url, result, canonical)
+        token = next(self.tokens)
+        self.waiting[token] = (url, result, canonical)
+        self.page_checks.append((token, *result.fingerprint))
+
+    def sync(self):
+        while self.conn.poll():
+            message = self.conn.recv()
+            if message[0] == 'links':
+                self.received += len(message[1])
+                for url, depth, referrer in message[1]:
+                    super().add(url, depth, referrer)
+            elif message[0] == 'duplicates':
+                for token, duplicate in message[1]:
+                    self.follow(*self.waiting.pop(token), duplicate)
+            elif message[0] == 'patterns':
+                for token, reason in message[1]:
+                    url, depth, referrer = self.waiting.pop(token)
+                    if reason is None:
+                        super().enqueue(url, depth, referrer)
+                    else:
+                        self.skip(url, depth, referrer, reason)
+            elif message[0] == 'stop':
+                self.stopped = True
+        queued = len(self.outbox) + len(self.finished) + len(self.page_checks) + len(self.pattern_checks)
+        if queued >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        # Messages are capped at batch_size items, a sitemap's worth of links would otherwise go in one
+        self.last_flush = time.monotonic()
+        for kind, items in (('links', self.outbox), ('results', self.finished),
+                            ('check_pages', self.page_checks), ('check_patterns', self.pattern_checks)):
+            for batch in chunks(items, self.batch_size):
+                self.conn.send((kind, batch))
+        self.sent += len(self.outbox)
+        self.outbox, self.finished, self.page_checks, self.pattern_checks = [], [], [], []
+
+    def idle(self):
+        # Tell the coordinator how many links this worker has taken in; the crawl is over once every
+        # worker is idle having received everything that was sent to it. A worker still waiting on
+        # answers from the coordinator is not idle.
+        self.flush()
+        if not self.waiting and self.reported != (self.received, self.sent):
+            self.reported = (self.received, self.sent)
+            self.conn.send(('idle', self.received))
+        return self.stopped
+
+
+def run_worker(address, authkey):
+    # Worker process entry point: connects to the coordinator, crawls its partition until told to stop
+    conn = Client(address, authkey=authkey)
+    try:
+        worker_id, workers, base_url, options = conn.recv()
+        engine = PartitionedCrawlEngine(conn, worker_id, workers, base_url, **options)
+        try:
+            engine.run()
+            engine.flush()
+            conn.send(('finished',))
+        except Exception:
+            conn.send(('error', f"worker {worker_id}: {traceback.format_exc()}"))
+    except (KeyboardInterrupt, EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def run_local_worker(address, authkey):
+    # Ctrl-C reaches every process in the terminal's group; a local worker leaves it to the
+    # coordinator, which stops the workers by closing their connections, so each one still
+    # shuts down its parse pool instead of leaving its processes behind
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_worker(address, authkey)
+
+
+class ConnectionWriter:
+    # Sends to one worker from its own thread, so the coordinator never blocks on a worker
+    # that is busy sending to it
+    def __init__(self, conn):
+        self.conn = conn
+        self.messages = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def send(self, message):
+        self.messages.put(message)
+
+    def run(self):
+        while True:
+            message = self.messages.get()
+            if message is None:
+                return
+            try:
+                self.conn.send(message)
+            except OSError:
+                return  # The worker is gone, the coordinator notices on its side of the connection
+
+    def close(self, timeout=5):
+        self.messages.put(None)
+        self.thread.join(timeout)
+
+
+class DistributedCrawl:
+    # Coordinator of a crawl split over several worker processes, local or on other machines.
+    # Workers connect over a socket; the coordinator relays links between them, merges their
+    # results into on_result, keeps the trap detector's memory of the whole crawl and decides
+    # when the crawl is finished.
+    def __init__(self, base_url, on_result, workers=4, partition_by='url', address=('127.0.0.1', 0), authkey=None,
+                 spawn=True, is_running=None, on_tick=None, **options):
+        self.base_url = base_url
+        self.on_result = on_result
+        self.workers = max(1, workers)
+        self.partition_by = partition_by
+        self.address = address
+        self.authkey = authkey or os.urandom(16)
+        self.spawn = spawn  # False waits for workers started elsewhere with `python distributed.py HOST:PORT`
+        self.is_running = is_running or (lambda: True)
+        self.on_tick = on_tick  # Called on every pass of the coordinator loop, like CrawlEngine's
+        self.traps = options.get('traps')
+        self.options = options
+        if options.get('state') or options.get('cache') or options.get('metrics'):
+            raise ValueError("Saved state, the validator cache and metrics are not available in distributed mode")
+
+    def worker_options(self, worker_id):
+        options = dict(self.options, partition_by=self.partition_by)
+        if self.partition_by == 'url':
+            # Every worker sends to every host, so each gets its share of the per-host limits
+            options['host_share'] = 1 / self.workers
+        if self.traps is not None:
+            # Workers only run the checks that look at a single URL, and ask the coordinator the rest
+            traps = copy.copy(self.traps)
+            traps.pattern_budget = None
+            options['traps'] = traps
+            options['shared_budget'] = bool(self.traps.pattern_budget)
+        if worker_id != 0:
+            options['use_sitemaps'] = False  # One worker reads the sitemaps and routes what it finds
+        return options
+
+    def run(self):
+        processes = []
+        conns = []
+        writers = []
+        with Listener(self.address, authkey=self.authkey) as listener:
+            self.address = listener.address
+            if self.spawn:
+                context = multiprocessing.get_context()
+                for _ in range(self.workers):
+                    # Not daemonic, so a worker may start its own parse pool processes
+                    process = context.Process(target=run_local_worker, args=(listener.address, self.authkey))
+                    process.start()
+                    processes.append(process)
+            while len(conns) < self.workers:
+                conns.append(listener.accept())
+        try:
+            writers = [ConnectionWriter(conn) for conn in conns]
+            for worker_id, writer in enumerate(writers):
+                writer.send((worker_id, self.workers, self.base_url, self.worker_options(worker_id)))
+            self.coordinate(conns, writers)
+        finally:
+            for writer in writers:
+                writer.close()
+            for conn in conns:
+                conn.close()
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+
+    def coordinate(self, conns, writers):
+        index = {conn: worker_id for worker_id, conn in enumerate(conns)}
+        forwarded = [0] * len(conns)
+        idle = [None] * len(conns)  # Links received as of the worker's last idle report, None while busy
+        open_conns = set(conns)
+        stopping = False
+        while open_conns:
+            if self.on_tick is not None:
+                self.on_tick()
+            if not stopping and (not self.is_running() or all(idle[w] == forwarded[w] for w in range(len(conns)))):
+                stopping = True
+                for conn in open_conns:
+                    writers[index[conn]].send(('stop',))
+            for conn in wait(list(open_conns), timeout=0.1):
+                worker_id = index[conn]
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    open_conns.discard(conn)
+                    if not stopping:
+                        raise RuntimeError(f"Worker {worker_id} disconnected")
+                    continue
+                kind = message[0]
+                if kind == 'links':
+                    idle[worker_id] = None
+                    batches = {}
+                    for owner, url, depth, referrer in message[1]:
+                        batches.setdefault(owner, []).append((url, depth, referrer))
+                    for owner, batch in batches.items():
+                        forwarded[owner] += len(batch)
+                        if not stopping:
+                            writers[owner].send(('links', batch))
+                elif kind == 'results':
+                    for row in message[1]:
+                        self.on_result(CrawlRecord(*row))
+                elif kind == 'check_pages':
+                    idle[worker_id] = None
+                    if not stopping:
+                        writers[worker_id].send(('duplicates', [(token, self.traps.duplicate_of(exact, simhash))
+                                                                for token, exact, simhash in message[1]]))
+                elif kind == 'check_patterns':
+                    idle[worker_id] = None
+                    if not stopping:
+                        writers[worker_id].send(('patterns', [(token, self.traps.count_pattern(pattern))
+                                                              for token, pattern in message[1]]))
+                elif kind == 'idle':
+                    idle[worker_id] = message[1]
+                elif kind == 'finished':
+                    open_conns.discard(conn)
+                elif kind == 'error':
+                    for other in open_conns - {conn}:
+                        writers[index[other]].send(('stop',))
+                    raise RuntimeError(message[1])
+
+
+def crawl_distributed(base_url, on_result, workers=4, **options):
+    DistributedCrawl(base_url, on_result, workers, **options).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one worker of a distributed crawl")
+    parser.add_argument('coordinator', help="HOST:PORT the coordinator listens on")
+    parser.add_argument('--authkey', required=True, help="Shared secret given to the coordinator")
+    args = parser.parse_args()
+    run_worker(parse_address(args.coordinator), args.authkey.encode('utf-8'))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import requests
+
+from crawler import content_length, create_session
+from metrics import instrument_session
+
+CHUNK_SIZE = 64 * 1024
+
+
+class OperationCanceledError(Exception): pass
+
+
+def response_validator(response):
+    # What If-Range can name: a strong ETag, or else Last-Modified
+    etag = response.headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('last-modified')
+
+
+def unique_save_path(directory, filename, taken):
+    # Same naming as before: add a timestamp when the file already exists, and a counter
+    # when several files in one batch share a name
+    save_path = os.path.join(directory, filename)
+    if os.path.exists(save_path) or save_path in taken:
+        name, ext = os.path.splitext(filename)
+        save_path = os.path.join(directory, f"{name}_{int(time.time())}{ext}")
+        counter = 1
+        while os.path.exists(save_path) or save_path in taken:
+            save_path = os.path.join(directory, f"{name}_{int(time.time())}_{counter}{ext}")
+            counter += 1
+    taken.add(save_path)
+    return save_path
+
+
+class DownloadJob:
+    __slots__ = ('url', 'save_path', 'total', 'downloaded', 'error')
+
+    def __init__(self, url, save_path):
+        self.url = url
+        self.save_path = save_path
+        self.total = 0
+        self.downloaded = 0
+        self.error = None
+
+    @property
+    def part_path(self):
+        return self.save_path + '.part'
+
+    @property
+    def state_path(self):
+        return self.save_path + '.part.json'
+
+
+class DownloadEngine:
+    # Downloads several files at once over one pooled session. Data goes to a .part file that is
+    # resumed with a Range request next time, as long as the file's ETag or Last-Modified still
+    # matches, and large files can be fetched as parallel byte ranges.
+    def __init__(self, max_parallel=4, segments=4, segment_threshold=8 * 1024 * 1024, session=None,
+                 is_cancelled=None, on_progress=None, on_file_done=None, progress_interval=0.1, timeout=20,
+                 metrics=None, state_interval=1.0):
+        self.max_parallel = max(1, max_parallel)
+        self.segments = max(1, segments)
+        self.segment_threshold = segment_threshold
+        self.session = session or create_session(self.max_parallel * self.segments)
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.on_progress = on_progress
+        self.on_file_done = on_file_done
+        self.progress_interval = progress_interval
+        self.timeout = timeout
+        self.state_interval = state_interval  # Seconds between saves of segment progress
+        self.metrics = metrics
+        if metrics is not None:
+            instrument_session(self.session, metrics)
+
+        self.lock = threading.Lock()
+        self.active = []
+        self.bytes_downloaded = 0
+        self.started = time.monotonic()
+        self.last_progress = 0
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.bytes_downloaded / elapsed if elapsed > 0 else 0
+
+    def active_jobs(self):
+        with self.lock:
+            return list(self.active)
+
+    def download_all(self, jobs):
+        self.started = time.monotonic()
+        successful, failed = [], []
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            futures = {pool.submit(self.download, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    future.result()
+                    successful.append(job)
+                except Exception as e:
+                    job.error = e
+                    failed.append(job)
+                    if self.metrics is not None and not isinstance(e, OperationCanceledError):
+                        self.metrics.record_error(e)
+                if self.on_file_done:
+                    self.on_file_done(job, job.error is None)
+        return successful, failed
+
+    def download(self, job):
+        self.check_cancelled()
+        with self.lock:
+            self.active.append(job)
+        try:
+            total, ranged, validator = self.probe(job.url) if self.segments > 1 else (0, False, None)
+            if ranged and total >= self.segment_threshold:
+                self.download_segmented(job, total, validator)
+            else:
+                self.download_single(job)
+            os.replace(job.part_path, job.save_path)
+            if os.path.exists(job.state_path):
+                os.remove(job.state_path)
+        finally:
+            with self.lock:
+                self.active.remove(job)
+            self.report_progress(force=True)
+
+    def probe(self, url):
+        try:
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        except requests.RequestException:
+            return 0, False, None
+        return content_length(response), response.headers.get('accept-ranges', '').lower() == 'bytes', response_validator(response)
+
+    def load_state(self, job):
+        # The validator, and for segmented downloads their progress, saved next to the .part file
+        try:
+            with open(job.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, job, state):
+        temp_path = job.state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, job.state_path)
+
+    def download_single(self, job):
+        offset = os.path.getsize(job.part_path) if os.path.exists(job.part_path) else 0
+        state = self.load_state(job) if offset else {}
+        # A part left by a segmented download has holes, and without a validator there is no
+        # telling whether the part still matches the remote file
+        validator = state.get('validator') if 'segments' not in state else None
+        if not validator:
+            offset = 0
+        # If-Range makes the server send the whole file instead of a range when it has changed
+        headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else None
+        with self.session.get(job.url, stream=True, timeout=self.timeout, headers=headers) as response:
+            if self.metrics is not None:
+                self.metrics.observe('download_ttfb', response.elapsed.total_seconds())
+            if offset and response.status_code == 416:
+                if response.headers.get('content-range') == f'bytes */{offset}':
+                    job.total = job.downloaded = offset  # The part already holds the whole file
+                    return
+                # The saved part no longer fits the remote file, start over
+                os.remove(job.part_path)
+                return self.download_single(job)
+            response.raise_for_status()
+            if offset and (response.status_code != 206 or not response.headers.get('content-range', '').startswith(f'bytes {offset}-')):
+                offset = 0  # The file changed, or the server ignored the Range header, and sent the whole file
+            if not offset:
+                self.save_state(job, {'validator': response_validator(response)})
+            job.total = offset + content_length(response) if content_length(response) else 0
+            job.downloaded = offset
+            with open(job.part_path, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    self.check_cancelled()
+                    f.write(chunk)
+                    self.advance(job, len(chunk))
+
+    def download_segmented(self, job, total, validator):
+        # Each segment is [start, end, bytes done]; the list is saved next to the .part file while
+        # the download runs, so an interrupted download only refetches what is missing
+        state = self.load_state(job)
+        segments = state.get('segments')
+        if (not validator or state.get('validator') != validator or state.get('total') != total or not segments
+                or not os.path.exists(job.part_path) or os.path.getsize(job.part_path) != total):
+            size = -(-total // self.segments)
+            segments = [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+            with open(job.part_path, 'wb') as f:
+                f.truncate(total)
+
+        job.total = total
+        job.downloaded = sum(done for _, _, done in segments)
+        state = {'validator': validator, 'total': total, 'segments': segments}
+        self.save_state(job, state)
+        try:
+            with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+                futures = [pool.submit(self.fetch_segment, job, segment, validator) for segment in segments if segment[0] + segment[2] <= segment[1]]
+                while futures:
+                    done, futures = wait(futures, timeout=self.state_interval)
+                    for future in done:
+                        future.result()
+                    self.save_state(job, state)
+        except BaseException:
+            self.save_state(job, state)
+            raise
+
+    def fetch_segment(self, job, segment, validator=None):
+        start, end, done = segment
+        headers = {'Range': f'bytes={start + done}-{end}'}
+        if validator:
+            headers['If-Range'] = validator
+        with self.session.get(job.url, stream=True, timeout=self.timeout, headers=headers) as response:
+            if self.metrics is not None:
+                self.metrics.observe('download_ttfb', response.elapsed.total_seconds())
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise requests.HTTPError(f"Server ignored the byte range for {job.url}, or the file changed")
+            # Unbuffered, so the progress saved in the state file is always on disk
+            with open(job.part_path, 'r+b', buffering=0) as f:
+                f.seek(start + done)
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    self.check_cancelled()
+                    chunk = chunk[:end + 1 - start - segment[2]]
+                    f.write(chunk)
+                    segment[2] += len(chunk)
+                    self.advance(job, len(chunk))
+
+    def advance(self, job, size):
+        with self.lock:
+            job.downloaded += size
+            self.bytes_downloaded += size
+        if self.metrics is not None:
+            self.metrics.add('download_bytes', size)
+        self.report_progress()
+
+    def report_progress(self, force=False):
+        now = time.monotonic()
+        if self.on_progress and (force or now - self.last_progress >= self.progress_interval):
+            self.last_progress = now
+            self.on_progress(self)
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise OperationCanceledError("Download was cancelled by the user.")
@@ -0,0 +1,226 @@
+import hashlib
+import math
+import re
+from array import array
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only track where a visitor came from and never change the page
+TRACKING_PARAMS = frozenset({
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'utm_id',
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'ref_src',
+})
+
+_PERCENT_ESCAPE = re.compile(r'%[0-9a-fA-F]{2}')
+
+
+def remove_dot_segments(path):
+    # RFC 3986 section 5.2.4
+    output = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    if path.endswith(('/.', '/..')):
+        output.append('')
+    return '/'.join(output)
+
+
+def strip_path_params(path, strip_params):
+    # Matrix parameters such as /cart;jsessionid=ABC are dropped like their query string twins
+    segments = []
+    for segment in path.split('/'):
+        if ';' in segment:
+            name, *params = segment.split(';')
+            segment = ';'.join([name] + [p for p in params if p.partition('=')[0].lower() not in strip_params])
+        segments.append(segment)
+    return '/'.join(segments)
+
+
+def canonicalize_url(url, strip_params=TRACKING_PARAMS):
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+
+    host = parts.netloc
+    if port is not None or '@' in host or not host.islower() or host.endswith('.'):
+        host = (parts.hostname or '').rstrip('.')
+        if ':' in host:
+            host = f'[{host}]'
+        if port is not None and port != DEFAULT_PORTS[scheme]:
+            host = f'{host}:{port}'
+        if parts.username or parts.password:
+            host = parts.netloc.rpartition('@')[0] + '@' + host
+
+    path = parts.path or '/'
+    if '%' in path:
+        path = _PERCENT_ESCAPE.sub(lambda m: m.group(0).upper(), path)
+    if '/.' in path:
+        path = remove_dot_segments(path)
+    if ';' in path:
+        path = strip_path_params(path, strip_params)
+
+    query = parts.query
+    if query:
+        # Sort the raw pairs so their original encoding is kept
+        params = [p for p in query.split('&') if p]
+        params = sorted(p for p in params if unquote_plus(p.partition('=')[0]).lower() not in strip_params)
+        query = '&'.join(params)
+
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def fingerprint(url):
+    # 0 is reserved as the empty-slot marker in FingerprintSet
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little') or 1
+
+
+class FingerprintSet:
+    # Open-addressing hash set of 64-bit fingerprints stored in a flat array,
+    # roughly 12 bytes per URL against ~100 for a set of strings
+    def __init__(self, capacity=1024):
+        size = 1 << max(4, math.ceil(math.log2(capacity / 0.7)))
+        self.slots = array('Q', bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, fp):
+        slots, mask = self.slots, self.mask
+        i = fp & mask
+        while True:
+            value = slots[i]
+            if value == fp:
+                return True
+            if value == 0:
+                return False
+            i = (i + 1) & mask
+
+    def add(self, fp):
+        if (self.count + 1) > len(self.slots) * 0.7:
+            self._grow()
+        slots, mask = self.slots, self.mask
+        i = fp & mask
+        while True:
+            value = slots[i]
+            if value == fp:
+                return False
+            if value == 0:
+                slots[i] = fp
+                self.count += 1
+                return True
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self.slots
+        self.slots = array('Q', bytes(16 * len(old)))
+        self.mask = len(self.slots) - 1
+        self.count = 0
+        for fp in old:
+            if fp:
+                self.add(fp)
+
+    def __iter__(self):
+        return (fp for fp in self.slots if fp)
+
+
+class BloomFilter:
+    # Fixed-size alternative to FingerprintSet; may wrongly report a new URL as seen
+    # at the configured error rate, but never grows past its initial allocation
+    def __init__(self, capacity=5_000_000, error_rate=0.001):
+        bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.size = bits
+        self.hashes = max(1, round(bits / capacity * math.log(2)))
+        self.bits = bytearray((bits + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, fp):
+        # Double hashing: k positions derived from the two halves of the 64-bit fingerprint
+        h1, h2 = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, fp):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(fp))
+
+    def add(self, fp):
+        bits = self.bits
+        added = False
+        for p in self._positions(fp):
+            byte, mask = p >> 3, 1 << (p & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class Frontier:
+    def __init__(self, strip_params=TRACKING_PARAMS, use_bloom=False, expected_urls=1_000_000, error_rate=0.001):
+        self.strip_params = frozenset(p.lower() for p in strip_params)
+        self.seen = BloomFilter(expected_urls, error_rate) if use_bloom else FingerprintSet(expected_urls // 8)
+        # Pending URLs are queued per host so a busy host never blocks the others. Each entry is
+        # three flat items, url, depth and referrer, so the queue is the only copy of a URL's origin;
+        # the referrer is the same string object for every link found on a page
+        self.queues = {}
+        self.hosts = deque()
+        self.pending = 0
+
+    def __len__(self):
+        return self.pending
+
+    def canonicalize(self, url):
+        return canonicalize_url(url, self.strip_params)
+
+    def add(self, url):
+        # Expects a canonical URL; returns False if it was already seen
+        if not self.mark_seen(url):
+            return False
+        self.push(url)
+        return True
+
+    def mark_seen(self, url):
+        # Records the URL without queueing it; returns False if it was already seen
+        return self.seen.add(fingerprint(url))
+
+    def push(self, url, depth=0, referrer=None):
+        # Queues without the seen check, used when restoring a saved crawl
+        host = urlsplit(url).netloc
+        queue = self.queues.get(host)
+        if queue is None:
+            queue = self.queues[host] = deque()
+            self.hosts.append(host)
+        queue.extend((url, depth, referrer))
+        self.pending += 1
+
+    def pop(self, host_ready=None):
+        # Round-robin over hosts that still have work and that host_ready accepts;
+        # returns (url, depth, referrer) or None
+        for _ in range(len(self.hosts)):
+            host = self.hosts[0]
+            self.hosts.rotate(-1)
+            if host_ready is not None and not host_ready(host):
+                continue
+            queue = self.queues[host]
+            entry = queue.popleft(), queue.popleft(), queue.popleft()
+            if not queue:
+                del self.queues[host]
+                self.hosts.pop()
+            self.pending -= 1
+            return entry
+        return None
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import time
+import zlib
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS validators (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    size INTEGER,
+    links BLOB,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS validators_last_used ON validators (last_used);
+"""
+
+
+class CacheEntry:
+    __slots__ = ('etag', 'last_modified', 'content_type', 'size', 'links')
+
+    def __init__(self, etag, last_modified, content_type, size, links):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.size = size
+        self.links = links
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def pack_links(links):
+    return zlib.compress('\n'.join(links).encode('utf-8'))
+
+
+def unpack_links(blob):
+    text = zlib.decompress(blob).decode('utf-8')
+    return text.split('\n') if text else []
+
+
+class ValidatorCache:
+    # ETag/Last-Modified cache keyed by URL, kept between crawls so a re-crawl can send
+    # conditional requests and reuse the stored outlinks on 304. Use from a single thread.
+    def __init__(self, path, max_entries=200_000, batch_size=500):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.updates = {}  # url -> row waiting to be written
+        self.touched = {}  # url -> last_used for entries that were revalidated
+
+    def get(self, url):
+        row = self.updates.get(url)
+        if row is None:
+            row = self.conn.execute(
+                "SELECT url, etag, last_modified, content_type, size, links FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+        _, etag, last_modified, content_type, size, links = row[:6]
+        return CacheEntry(etag, last_modified, content_type, size, unpack_links(links))
+
+    def put(self, url, etag, last_modified, content_type, size, links):
+        self.updates[url] = (url, etag, last_modified, content_type, size, pack_links(links), time.time())
+        self.touched.pop(url, None)
+        self.maybe_flush()
+
+    def touch(self, url):
+        if url not in self.updates:
+            self.touched[url] = time.time()
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        if len(self.updates) + len(self.touched) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.updates and not self.touched:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified, content_type, size, links, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", self.updates.values()
+            )
+            self.conn.executemany(
+                "UPDATE validators SET last_used = ? WHERE url = ?", ((t, url) for url, t in self.touched.items())
+            )
+            self.evict()
+        self.updates.clear()
+        self.touched.clear()
+
+    def evict(self):
+        # Drop the least recently used entries once over the size bound, with some slack
+        # so eviction does not run on every flush
+        count = self.conn.execute("SELECT COUNT(*) FROM validators").fetchone()[0]
+        if count > self.max_entries:
+            excess = count - int(self.max_entries * 0.9)
+            self.conn.execute(
+                "DELETE FROM validators WHERE url IN (SELECT url FROM validators ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,150 @@
+import codecs
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+LINK_TAGS = ['a', 'link', 'script', 'img', 'iframe', 'video', 'source']
+
+
+def strip_fragment(url):
+    parsed = urlparse(url)
+    return parsed._replace(fragment='').geturl()
+
+
+def resolve_links(url, base_href, hrefs):
+    # The first <base href> applies to every link in the document, including ones before it
+    base = urljoin(url, base_href) if base_href else url
+    return [strip_fragment(urljoin(base, href)) for href in hrefs]
+
+
+def known_encoding(encoding):
+    # A declared charset Python has no codec for, such as x-bogus, counts as undeclared
+    if encoding:
+        try:
+            codecs.lookup(encoding)
+            return encoding
+        except LookupError:
+            pass
+    return None
+
+
+def decode_body(body, encoding=None):
+    encoding = known_encoding(encoding)
+    if encoding:
+        return body.decode(encoding, errors='replace')
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError:
+        # Undeclared legacy pages are nearly always Windows-1252
+        return body.decode('windows-1252', errors='replace')
+
+
+class LinkExtractor:
+    name = None
+
+    def extract(self, url, body, encoding=None):
+        raise NotImplementedError
+
+
+class SoupLinkExtractor(LinkExtractor):
+    name = 'soup'
+
+    def extract(self, url, body, encoding=None):
+        soup = BeautifulSoup(body, 'html.parser', from_encoding=known_encoding(encoding))
+        base = soup.find('base', href=True)
+        hrefs = []
+        for tag in soup.find_all(LINK_TAGS):
+            href = tag.get('href') or tag.get('src')
+            if href:
+                hrefs.append(href)
+        return resolve_links(url, base['href'] if base else None, hrefs)
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.base_href = None
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in LINK_TAGS:
+            attrs = dict(attrs)
+            href = attrs.get('href') or attrs.get('src')
+            if href:
+                self.hrefs.append(href)
+        elif tag == 'base' and self.base_href is None:
+            self.base_href = dict(attrs).get('href')
+
+    handle_startendtag = handle_starttag
+
+
+class StreamingLinkExtractor(LinkExtractor):
+    # Only looks at start tags and never builds a tree
+    name = 'stream'
+
+    def extract(self, url, body, encoding=None):
+        parser = _LinkParser()
+        if isinstance(body, bytes):
+            body = decode_body(body, encoding)
+        parser.feed(body)
+        parser.close()
+        return resolve_links(url, parser.base_href, parser.hrefs)
+
+
+class LxmlLinkExtractor(LinkExtractor):
+    name = 'lxml'
+
+    def extract(self, url, body, encoding=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+            encoding = 'utf-8'
+        if not body.strip():
+            return []
+        encoding = known_encoding(encoding)
+        if encoding is None:
+            # Same guess as decode_body; left to itself lxml reads undeclared UTF-8 as Latin-1
+            try:
+                body.decode('utf-8')
+                encoding = 'utf-8'
+            except UnicodeDecodeError:
+                encoding = 'windows-1252'
+        try:
+            parser = etree.HTMLParser(encoding=encoding)
+        except LookupError:
+            # A codec Python has but libxml2 lacks, parse Python's decoding instead
+            body, parser = decode_body(body, encoding).encode('utf-8'), etree.HTMLParser(encoding='utf-8')
+        root = etree.fromstring(body, parser)
+        if root is None:
+            return []
+        base_href = None
+        hrefs = []
+        for element in root.iter('base', *LINK_TAGS):
+            if element.tag == 'base':
+                if base_href is None:
+                    base_href = element.get('href')
+                continue
+            href = element.get('href') or element.get('src')
+            if href:
+                hrefs.append(href)
+        return resolve_links(url, base_href, hrefs)
+
+
+EXTRACTORS = {extractor.name: extractor for extractor in (SoupLinkExtractor, StreamingLinkExtractor)}
+if etree is not None:
+    EXTRACTORS[LxmlLinkExtractor.name] = LxmlLinkExtractor
+
+
+DEFAULT_EXTRACTOR = 'lxml' if etree is not None else 'stream'
+
+
+def get_extractor(name=DEFAULT_EXTRACTOR):
+    try:
+        return EXTRACTORS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown link extractor '{name}', available: {', '.join(sorted(EXTRACTORS))}")
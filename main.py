@@ -1,28 +1,105 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 import os
 import threading
-from collections import deque
+import multiprocessing
 import time
+from crawler import crawl
+from downloader import DownloadEngine, DownloadJob, unique_save_path
+from crawl_state import read_saved_crawl
+from results import FILE_TYPES, NOT_DOWNLOADABLE, ResultModel
+from metrics import CrawlMetrics, format_summary
+from sinks import open_sink
+from traps import TrapDetector
+
+class UIUpdateQueue:
+    # Worker threads push updates here instead of calling root.after themselves.
+    # A single periodic tick on the Tk thread applies everything queued since the last one:
+    # posted items are handed to their handler as one batch, keyed updates only keep the latest value,
+    # and plain calls run last, in order.
+    def __init__(self, root, interval_ms=100):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        self.batches = {}
+        self.latest = {}
+        self.calls = []
+        self.metrics = None  # Set to a CrawlMetrics to time each tick
+        self.root.after(self.interval_ms, self.tick)
+        
+    def post(self, handler, item):
+        with self.lock:
+            self.batches.setdefault(handler, []).append(item)
+            
+    def update(self, key, func, *args):
+        with self.lock:
+            self.latest[key] = (func, args)
+            
+    def call(self, func, *args):
+        with self.lock:
+            self.calls.append((func, args))
+            
+    def tick(self):
+        with self.lock:
+            batches, self.batches = self.batches, {}
+            latest, self.latest = self.latest, {}
+            calls, self.calls = self.calls, []
+        metrics = self.metrics
+        start = time.perf_counter()
+        try:
+            for handler, items in batches.items():
+                handler(items)
+            for func, args in latest.values():
+                func(*args)
+            for func, args in calls:
+                func(*args)
+        finally:
+            if metrics is not None and (batches or latest or calls):
+                metrics.observe('ui_update', time.perf_counter() - start)
+            self.root.after(self.interval_ms, self.tick)
 
 class WebCrawlerGUI:
-    def __init__(self, root):
+    def __init__(self, root, ui_update_ms=100):
         self.root = root
         self.root.title("Web Crawler")
-        self.root.geometry("800x600")
+        self.root.geometry("1000x600")
         
         # Variables
         self.base_url = ""
-        self.discovered_urls = set()
         self.crawling = False
         self.download_cancelled = False # Flag for cancelling downloads
         self.sort_reverse = {'Type': False, 'Size': False}  # Track sort direction for each column
-        self.file_data = {}  # Store file data for sorting
+        self.sort_column = None
+        self.results = ResultModel()  # Single backing store for everything found
+        self.view_rows = []  # Model rows in display order, after sorting and filtering
+        self.view_offset = 0  # First view row shown in the tree, only visible rows exist as tree items
+        self.selected = set()  # Selected model rows, including ones scrolled out of the tree
+        self.filter_args = {}
+        self.filter_job = None
+        self.filter_text = tk.StringVar()
+        self.filter_type = tk.StringVar(value="All")
+        self.filter_min = tk.StringVar()
+        self.filter_max = tk.StringVar()
+        self.max_workers = tk.IntVar(value=16)  # Global concurrency limit
+        self.per_host_limit = tk.IntVar(value=4)  # Most concurrent requests per host, the scheduler adapts below it
+        self.max_depth = tk.IntVar(value=100)  # Most clicks from the start page, 0 for no limit; stops traps no other check sees
+        self.probe_assets = tk.BooleanVar(value=True)  # HEAD non-HTML files for their size instead of guessing
+        self.respect_robots = tk.BooleanVar(value=True)  # Skip URLs disallowed by robots.txt
+        self.use_sitemaps = tk.BooleanVar(value=True)  # Seed the crawl from the site's sitemaps
+        self.skip_traps = tk.BooleanVar(value=True)  # Skip crawler traps and don't follow links of duplicate pages
+        self.pattern_budget = tk.IntVar(value=0)  # Most URLs per URL pattern before the rest are skipped, 0 for no limit
+        self.keep_results = tk.BooleanVar(value=True)  # List results in the window; off keeps memory flat on huge crawls
+        self.output_path = None  # File every result is streamed to while crawling
+        self.collect_metrics = tk.BooleanVar(value=False)  # Time every request phase for the Stats window
+        self.metrics = None  # CrawlMetrics of the current crawl and its downloads
+        self.stats_window = None
+        self.state_path = os.path.join(os.path.expanduser("~"), ".web_crawler", "crawl_state.db")  # Saved crawl for Resume
+        self.cache_path = os.path.join(os.path.expanduser("~"), ".web_crawler", "http_cache.db")  # ETag/Last-Modified of past crawls
+        self.download_options = {'max_parallel': 4, 'segments': 4}  # Parallel files, and byte ranges per large file
         
         self.setup_ui()
+        self.ui = UIUpdateQueue(self.root, ui_update_ms)  # Batched updates from worker threads
         
     def setup_ui(self):
         # Main frame
@@ -33,7 +110,7 @@ class WebCrawlerGUI:
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
         main_frame.columnconfigure(1, weight=1)
-        main_frame.rowconfigure(3, weight=1)  # Results frame gets the stretch
+        main_frame.rowconfigure(4, weight=1)  # Results frame gets the stretch
         
         # URL input
         ttk.Label(main_frame, text="Website URL:").grid(row=0, column=0, sticky=tk.W, pady=5)
@@ -62,37 +139,91 @@ class WebCrawlerGUI:
         self.stop_button = ttk.Button(button_frame, text="Stop", command=self.stop_crawling, state=tk.DISABLED)
         self.stop_button.pack(side=tk.LEFT, padx=5)
         
+        self.resume_button = ttk.Button(button_frame, text="Resume", command=self.resume_crawling)
+        self.resume_button.pack(side=tk.LEFT, padx=5)
+        if not read_saved_crawl(self.state_path):
+            self.resume_button.config(state=tk.DISABLED)
+        
         self.clear_button = ttk.Button(button_frame, text="Clear Results", command=self.clear_results)
         self.clear_button.pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(button_frame, text="Stats", command=self.show_stats).pack(side=tk.LEFT, padx=5)
+        
+        self.output_button = ttk.Button(button_frame, text="Stream to File...", command=self.choose_output)
+        self.output_button.pack(side=tk.LEFT, padx=5)
+        
+        # Crawl settings
+        settings_frame = ttk.Frame(main_frame)
+        settings_frame.grid(row=2, column=0, columnspan=2, pady=(0, 10), sticky=(tk.W, tk.E))
+        ttk.Label(settings_frame, text="Workers:").pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Spinbox(settings_frame, from_=1, to=256, width=4, textvariable=self.max_workers).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(settings_frame, text="Per host:").pack(side=tk.LEFT)
+        ttk.Spinbox(settings_frame, from_=1, to=64, width=4, textvariable=self.per_host_limit).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(settings_frame, text="Max depth:").pack(side=tk.LEFT)
+        ttk.Spinbox(settings_frame, from_=0, to=10_000, width=5, textvariable=self.max_depth).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Checkbutton(settings_frame, text="Probe asset sizes", variable=self.probe_assets).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(settings_frame, text="Obey robots.txt", variable=self.respect_robots).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(settings_frame, text="Use sitemaps", variable=self.use_sitemaps).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(settings_frame, text="Skip traps", variable=self.skip_traps).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(settings_frame, text="Pattern budget:").pack(side=tk.LEFT)
+        ttk.Spinbox(settings_frame, from_=0, to=10_000_000, increment=1000, width=8, textvariable=self.pattern_budget).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Checkbutton(settings_frame, text="List results", variable=self.keep_results).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Checkbutton(settings_frame, text="Collect metrics", variable=self.collect_metrics).pack(side=tk.LEFT)
+        
         # Progress bar
         self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
-        self.progress.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        self.progress.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
         
         # Results frame
         results_frame = ttk.LabelFrame(main_frame, text="Discovered Files and Pages", padding="5")
-        results_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        results_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
         results_frame.columnconfigure(0, weight=1)
-        results_frame.rowconfigure(0, weight=1)
+        results_frame.rowconfigure(1, weight=1)
+        
+        # Filter bar
+        filter_frame = ttk.Frame(results_frame)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.filter_text, width=30).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(filter_frame, text="Type:").pack(side=tk.LEFT)
+        ttk.Combobox(filter_frame, textvariable=self.filter_type, values=["All"] + FILE_TYPES, state='readonly', width=10).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(filter_frame, text="Size (KB):").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.filter_min, width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_frame, text="to").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.filter_max, width=8).pack(side=tk.LEFT, padx=5)
+        for var in (self.filter_text, self.filter_type, self.filter_min, self.filter_max):
+            var.trace_add('write', lambda *args: self.schedule_filter())
         
         # Treeview for results
-        self.tree = ttk.Treeview(results_frame, columns=('Type', 'Size'), show='tree headings', selectmode='extended')
+        self.tree = ttk.Treeview(results_frame, columns=('Type', 'Size', 'Note'), show='tree headings', selectmode='extended')
         self.tree.heading('#0', text='URL/File')
         self.tree.heading('Type', text='Type', command=lambda: self.sort_by_column('Type'))
         self.tree.heading('Size', text='Size', command=lambda: self.sort_by_column('Size'))
+        self.tree.heading('Note', text='Note')
         
-        self.tree.column('#0', width=600, stretch=tk.YES)
+        self.tree.column('#0', width=450, stretch=tk.YES)
         self.tree.column('Type', width=60, stretch=tk.NO, anchor=tk.W)
         self.tree.column('Size', width=70, stretch=tk.NO, anchor=tk.CENTER)
+        self.tree.column('Note', width=150, stretch=tk.YES, anchor=tk.W)  # Why a row was skipped
         
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        # Scrollbars, the vertical one scrolls the view window rather than the tree itself
+        self.v_scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.scroll_view)
         h_scrollbar = ttk.Scrollbar(results_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        
+        self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.v_scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        h_scrollbar.grid(row=2, column=0, sticky=(tk.W, tk.E))
+        
+        # Keep the view window and selection in step with the tree
+        self.tree.bind('<Configure>', lambda event: self.render_view())
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', self.on_mousewheel)  # Linux
+        self.tree.bind('<Button-5>', self.on_mousewheel)
+        self.tree.bind('<Prior>', lambda event: self.scroll_view('scroll', -1, 'pages'))
+        self.tree.bind('<Next>', lambda event: self.scroll_view('scroll', 1, 'pages'))
+        self.tree.bind('<ButtonPress-1>', self.on_tree_click)
+        self.tree.bind('<<TreeviewSelect>>', self.on_tree_select)
         
         # Bind double-click to download
         self.tree.bind('<Double-1>', self.on_item_double_click)
@@ -111,9 +242,19 @@ class WebCrawlerGUI:
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
-        status_bar.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        status_bar.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
         
-    def start_crawling(self):
+    def resume_crawling(self):
+        url = read_saved_crawl(self.state_path)
+        if not url:
+            messagebox.showerror("Error", "There is no saved crawl to resume")
+            self.resume_button.config(state=tk.DISABLED)
+            return
+        self.url_entry.delete(0, tk.END)
+        self.url_entry.insert(0, url)
+        self.start_crawling(resume=True)
+        
+    def start_crawling(self, resume=False):
         url = self.url_entry.get().strip()
         if not url:
             messagebox.showerror("Error", "Please enter a URL")
@@ -122,97 +263,196 @@ class WebCrawlerGUI:
         if not url.startswith(('http://', 'https://')):
             url = 'http://' + url
             
+        try:
+            engine_options = {
+                'max_workers': self.max_workers.get(),
+                'per_host_limit': self.per_host_limit.get(),
+                'max_depth': self.max_depth.get() or None,
+                'probe_assets': self.probe_assets.get(),
+                'respect_robots': self.respect_robots.get(),
+                'use_sitemaps': self.use_sitemaps.get(),
+                'resume': resume,
+            }
+            pattern_budget = self.pattern_budget.get()
+        except tk.TclError:
+            messagebox.showerror("Error", "Workers, per-host limit, max depth and pattern budget must be whole numbers")
+            return
+            
+        self.metrics = CrawlMetrics() if self.collect_metrics.get() else None
+        self.ui.metrics = self.metrics
+        engine_options['metrics'] = self.metrics
+        engine_options['traps'] = TrapDetector(pattern_budget=pattern_budget or None) if self.skip_traps.get() else None
         self.base_url = url
         self.crawling = True
         self.crawl_button.config(state=tk.DISABLED)
+        self.resume_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
         self.progress.start()
-        self.status_var.set("Crawling...")
+        self.status_var.set("Resuming..." if resume else "Crawling...")
         
-        threading.Thread(target=self.crawl_website, daemon=True).start()
+        threading.Thread(target=self.crawl_website, args=(engine_options, self.keep_results.get(), self.output_path), daemon=True).start()
         
     def stop_crawling(self):
         self.crawling = False
         self.crawl_button.config(state=tk.NORMAL)
+        self.resume_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.progress.stop()
         self.status_var.set("Stopped")
         
     def clear_results(self):
-        self.tree.delete(*self.tree.get_children())
-        self.discovered_urls.clear()
-        self.file_data.clear()
+        self.results.clear()
+        self.view_rows = []
+        self.view_offset = 0
+        self.selected.clear()
+        self.render_view()
         self.status_var.set("Results cleared")
         
-    def crawl_website(self):
+    def choose_output(self):
+        path = filedialog.asksaveasfilename(
+            title="Stream results to...",
+            defaultextension=".jsonl",
+            filetypes=[("JSON Lines", "*.jsonl"), ("CSV", "*.csv"), ("SQLite", "*.db")],
+        )
+        # Cancelling the dialog turns streaming off again
+        self.output_path = path or None
+        self.output_button.config(text=f"Streaming to {os.path.basename(path)}" if path else "Stream to File...")
+        
+    def crawl_website(self, engine_options, keep_results, output_path):
+        found = [0]
+        def on_result(record):
+            if sink is not None:
+                sink.write(record)
+            if keep_results:
+                self.ui.post(self.add_results, record)
+            else:
+                found[0] += 1
+                self.ui.update('crawl_count', self.update_status, f"Found {found[0]} files/pages")
+        
         try:
-            session = requests.Session()
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            })
-            
-            to_visit = deque([self.base_url])
-            visited = set()
-            
-            while to_visit and self.crawling:
-                current_url = to_visit.popleft()
-                
-                if current_url in visited:
-                    continue
-                    
-                visited.add(current_url)
-                
-                try:
-                    response = session.get(current_url, timeout=10)
-                    content_type = response.headers.get('content-type', '').lower()
-                    
-                    self.root.after(0, self.add_to_tree, current_url, content_type, len(response.content))
-                    
-                    if 'text/html' in content_type:
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        for tag in soup.find_all(['a', 'link', 'script', 'img', 'iframe', 'video', 'source']):
-                            href = tag.get('href') or tag.get('src')
-                            if href:
-                                full_url = urljoin(current_url, href)
-                                normalized_url = self.strip_fragment(full_url)
-                                if self.same_domain(normalized_url, self.base_url) and normalized_url not in visited:
-                                    to_visit.append(normalized_url)
-                                    
-                except requests.RequestException as e:
-                    self.root.after(0, self.add_to_tree, current_url, f"Error: {str(e)}", 0)
-                time.sleep(0.1)
-                
-            self.root.after(0, self.crawling_finished)
+            sink = open_sink(output_path) if output_path else None
+            try:
+                crawl(
+                    self.base_url,
+                    on_result=on_result,
+                    is_running=lambda: self.crawling,
+                    state_path=self.state_path,
+                    cache_path=self.cache_path,
+                    on_tick=sink.maybe_flush if sink is not None else None,
+                    **engine_options
+                )
+            finally:
+                if sink is not None:
+                    sink.close()
+            self.ui.call(self.crawling_finished, None if keep_results else found[0])
             
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Crawling failed: {str(e)}"))
-            self.root.after(0, self.crawling_finished)
+            self.ui.call(messagebox.showerror, "Error", f"Crawling failed: {str(e)}")
+            self.ui.call(self.crawling_finished)
             
-    def same_domain(self, url1, url2):
-        try:
-            return urlparse(url1).netloc == urlparse(url2).netloc
-        except:
-            return False
+    def add_results(self, results):
+        window_end = self.view_offset + self.visible_rows()
+        shown_before = len(self.view_rows)
+        for record in results:
+            row = self.results.add(record.url, record.content_type, record.size, record.skipped)  # None if already listed before a resume
+            if row is not None and (not self.filter_args or self.results.filter_rows([row], **self.filter_args)):
+                self.view_rows.append(row)
+        if shown_before < window_end:
+            self.render_view()
+        else:
+            self.update_scrollbar()
+        self.update_status(f"Found {len(self.results)} files/pages")
+        
+    def update_status(self, text):
+        if len(self.view_rows) != len(self.results):
+            text += f" (showing {len(self.view_rows)})"
+        self.status_var.set(text)
+        
+    def visible_rows(self):
+        rowheight = ttk.Style().lookup('Treeview', 'rowheight') or 20
+        return max(1, self.tree.winfo_height() // int(rowheight) - 1)
         
-    def strip_fragment(self, url):
-        parsed = urlparse(url)
-        return parsed._replace(fragment='').geturl()
+    def render_view(self):
+        visible = self.visible_rows()
+        self.view_offset = max(0, min(self.view_offset, len(self.view_rows) - visible))
+        rows = self.view_rows[self.view_offset:self.view_offset + visible]
         
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            url, file_type, size = self.results.row(row)
+            size_str = self.format_size(size) if size > 0 else "Unknown"
+            self.tree.insert('', 'end', iid=str(row), text=url, values=(file_type, size_str, self.results.note(row)))
+        shown = [str(row) for row in rows if row in self.selected]
+        if shown:
+            self.tree.selection_set(shown)
+        self.update_scrollbar()
+        
+    def update_scrollbar(self):
+        total = len(self.view_rows)
+        if not total:
+            self.v_scrollbar.set(0, 1)
+            return
+        end = min(total, self.view_offset + self.visible_rows())
+        self.v_scrollbar.set(self.view_offset / total, end / total)
+        
+    def scroll_view(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.view_offset = int(float(amount) * len(self.view_rows))
+        else:
+            step = self.visible_rows() if unit == 'pages' else 1
+            self.view_offset += int(amount) * step
+        self.render_view()
+        return "break"
+        
+    def on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            return self.scroll_view('scroll', -3)
+        return self.scroll_view('scroll', 3)
+        
+    def on_tree_click(self, event):
+        # A plain click replaces the selection, including rows scrolled out of view
+        if not event.state & 0x0005:  # Shift or Control held
+            self.selected.clear()
             
-    def add_to_tree(self, url, content_type, size):
-        file_type = "Other"
-        if 'text/html' in content_type: file_type = "HTML"
-        elif 'image/' in content_type: file_type = "Image"
-        elif 'text/css' in content_type: file_type = "CSS"
-        elif 'javascript' in content_type: file_type = "JavaScript"
-        elif 'application/pdf' in content_type: file_type = "PDF"
-        elif 'Error:' in content_type: file_type = "Error"
-        
-        size_str = self.format_size(size) if size > 0 else "Unknown"
-        self.file_data[url] = {'type': file_type, 'size': size, 'size_str': size_str, 'content_type': content_type}
-        self.tree.insert('', 'end', text=url, values=(file_type, size_str))
-        self.discovered_urls.add(url)
-        self.status_var.set(f"Found {len(self.discovered_urls)} files/pages")
+    def on_tree_select(self, event):
+        for iid in self.tree.get_children():
+            self.selected.discard(int(iid))
+        self.selected.update(int(iid) for iid in self.tree.selection())
+        
+    def selected_rows(self):
+        return sorted(self.selected)
+        
+    def schedule_filter(self):
+        # Debounce typing so the filter runs once the user pauses
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(250, self.apply_filter)
+        
+    def apply_filter(self):
+        self.filter_job = None
+        self.filter_args = {}
+        if self.filter_text.get().strip():
+            self.filter_args['text'] = self.filter_text.get().strip()
+        if self.filter_type.get() != "All":
+            self.filter_args['file_type'] = self.filter_type.get()
+        for key, var in (('min_size', self.filter_min), ('max_size', self.filter_max)):
+            try:
+                self.filter_args[key] = int(float(var.get()) * 1024)
+            except ValueError:
+                pass  # Empty or not a number, leave that bound open
+        self.refresh_view()
+        self.update_status(f"Found {len(self.results)} files/pages")
+        
+    def refresh_view(self):
+        if self.sort_column is None:
+            rows = range(len(self.results))
+        else:
+            rows = self.results.sorted_rows(self.sort_column)
+            if self.sort_reverse[self.sort_column]:
+                rows = rows[::-1]
+        self.view_rows = self.results.filter_rows(rows, **self.filter_args)
+        self.view_offset = 0
+        self.render_view()
         
     def format_size(self, size):
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -221,29 +461,33 @@ class WebCrawlerGUI:
             size /= 1024.0
         return f"{size:.1f} PB"
         
-    def crawling_finished(self):
+    def crawling_finished(self, found=None):
+        # found is given when results were only counted, not listed
         self.crawling = False
         self.crawl_button.config(state=tk.NORMAL)
+        self.resume_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.progress.stop()
-        self.status_var.set(f"Crawling complete. Found {len(self.discovered_urls)} files/pages")
+        self.update_status(f"Crawling complete. Found {len(self.results) if found is None else found} files/pages")
         
     def on_item_double_click(self, event):
         selection = self.tree.selection()
         if selection:
-            item = selection[0]
-            url = self.tree.item(item)['text']
-            if self.tree.item(item)['values'][0] == "Error":
-                messagebox.showwarning("Cannot Download", "This URL had an error and cannot be downloaded.")
+            row = int(selection[0])
+            url = self.results.urls[row]
+            if self.results.file_type(row) in NOT_DOWNLOADABLE:
+                messagebox.showwarning("Cannot Download", "This URL had an error or was skipped and cannot be downloaded.")
                 return
             self.download_file_with_progress(url)
     
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
         if item and item not in self.tree.selection():
+            self.selected.clear()
+            self.selected.add(int(item))
             self.tree.selection_set(item)
         
-        selection = self.tree.selection()
+        selection = self.selected_rows()
         if selection:
             if len(selection) == 1:
                 self.context_menu.entryconfig(0, label="Download")
@@ -254,9 +498,9 @@ class WebCrawlerGUI:
             self.context_menu.post(event.x_root, event.y_root)
     
     def copy_url(self):
-        selection = self.tree.selection()
+        selection = self.selected_rows()
         if selection:
-            urls = [self.tree.item(item)['text'] for item in selection]
+            urls = [self.results.urls[row] for row in selection]
             self.root.clipboard_clear()
             self.root.clipboard_append('\n'.join(urls))
             self.status_var.set(f"{len(urls)} URL(s) copied to clipboard")
@@ -278,22 +522,16 @@ class WebCrawlerGUI:
     
     def sort_by_column(self, column):
         self.sort_reverse[column] = not self.sort_reverse[column]
-        items = [(self.tree.item(item)['text'], self.tree.item(item)['values']) for item in self.tree.get_children()]
-        
-        sort_key = lambda x: (x[1][0] if column == 'Type' else self.file_data.get(x[0], {}).get('size', 0))
-        items.sort(key=sort_key, reverse=self.sort_reverse[column])
-        
-        self.tree.delete(*self.tree.get_children())
-        for url, values in items:
-            self.tree.insert('', 'end', text=url, values=values)
+        self.sort_column = column
+        self.refresh_view()
 
     def download_selected(self):
-        selection = self.tree.selection()
+        selection = self.selected_rows()
         if not selection: return
 
-        urls_to_download = [self.tree.item(item)['text'] for item in selection if self.tree.item(item)['values'][0] != "Error"]
+        urls_to_download = [self.results.urls[row] for row in selection if self.results.file_type(row) not in NOT_DOWNLOADABLE]
         if not urls_to_download:
-            messagebox.showwarning("No Valid Files", "The selected item(s) resulted in errors and cannot be downloaded.")
+            messagebox.showwarning("No Valid Files", "The selected item(s) resulted in errors or were skipped and cannot be downloaded.")
             return
 
         if len(urls_to_download) == 1:
@@ -377,57 +615,53 @@ class WebCrawlerGUI:
         ).start()
 
     def _execute_batch_download(self, url_list, directory, progress_window, overall_var, file_label, current_var, status_label, cancel_btn):
-        successful_downloads, failed_downloads = [], []
-        total_files = len(url_list)
-        i = 0
-
-        for i, url_info in enumerate(url_list):
-            if self.download_cancelled: break
-            
-            save_path = ""
+        jobs, taken = [], set()
+        for url_info in url_list:
             if isinstance(url_info, tuple):
                 url, save_path = url_info
             else:
                 url = url_info
                 filename = os.path.basename(urlparse(url).path) or "index.html"
-                save_path = os.path.join(directory, filename)
-                if os.path.exists(save_path):
-                    name, ext = os.path.splitext(filename)
-                    save_path = os.path.join(directory, f"{name}_{int(time.time())}{ext}")
+                save_path = unique_save_path(directory, filename, taken)
+            jobs.append(DownloadJob(url, save_path))
+        total_files = len(jobs)
+        finished = [0]
 
-            self.root.after(0, file_label.config, {'text': f"Current File: {os.path.basename(save_path)}"})
-            self.root.after(0, current_var.set, 0)
-            self.root.after(0, overall_var.set, i)
-            
-            try:
-                response = requests.get(url, stream=True, timeout=20)
-                response.raise_for_status()
-                total_size = int(response.headers.get('content-length', 0))
-                downloaded_size = 0
-                
-                with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if self.download_cancelled:
-                            raise OperationCanceledError("Download was cancelled by the user.")
-                        
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        
-                        status_text = f"Downloaded {self.format_size(downloaded_size)}"
-                        if total_size > 0:
-                            percentage = (downloaded_size / total_size) * 100
-                            self.root.after(0, current_var.set, percentage)
-                            status_text += f" of {self.format_size(total_size)} ({percentage:.1f}%)"
-                        self.root.after(0, status_label.config, {'text': status_text})
-                
-                successful_downloads.append(os.path.basename(save_path))
+        def on_progress(engine):
+            active = engine.active_jobs()
+            if active:
+                names = os.path.basename(active[0].save_path)
+                if len(active) > 1:
+                    names += f" (+{len(active) - 1} more)"
+                self.ui.update('download_file', file_label.config, {'text': f"Current File: {names}"})
+            downloaded = sum(job.downloaded for job in active)
+            total_size = sum(job.total for job in active)
             
-            except Exception as e:
-                failed_downloads.append(os.path.basename(url))
-                if os.path.exists(save_path):
-                    try: os.remove(save_path)
-                    except OSError: pass
-                if self.download_cancelled: break
+            status_text = f"Downloaded {self.format_size(downloaded)}"
+            if total_size > 0:
+                percentage = min(100, (downloaded / total_size) * 100)
+                self.ui.update('download_current', current_var.set, percentage)
+                status_text += f" of {self.format_size(total_size)} ({percentage:.1f}%)"
+            status_text += f" at {self.format_size(engine.throughput())}/s"
+            self.ui.update('download_status', status_label.config, {'text': status_text})
+
+        def on_file_done(job, ok):
+            finished[0] += 1
+            self.ui.update('download_overall', overall_var.set, finished[0])
+
+        if self.metrics is None and self.collect_metrics.get():
+            self.metrics = CrawlMetrics()
+            self.ui.metrics = self.metrics
+        engine = DownloadEngine(
+            is_cancelled=lambda: self.download_cancelled,
+            on_progress=on_progress,
+            on_file_done=on_file_done,
+            metrics=self.metrics if self.collect_metrics.get() else None,
+            **self.download_options
+        )
+        successful, failed = engine.download_all(jobs)
+        successful_downloads = [os.path.basename(job.save_path) for job in successful]
+        failed_downloads = [os.path.basename(job.url) for job in failed]
 
         def on_complete():
             is_single_file_success = total_files == 1 and not failed_downloads
@@ -437,7 +671,7 @@ class WebCrawlerGUI:
                 final_message = f"{len(successful_downloads)} file(s) downloaded before cancellation."
             elif is_single_file_success:
                 title_message = "Download Complete!"
-                final_message = f"File saved to:\n{url_list[0][1]}"
+                final_message = f"File saved to:\n{jobs[0].save_path}"
             else:
                 title_message = "Download Complete!"
                 final_message = f"Successful: {len(successful_downloads)}, Failed: {len(failed_downloads)}\nSaved in directory: {directory}"
@@ -447,7 +681,7 @@ class WebCrawlerGUI:
 
             file_label.config(text=title_message)
             status_label.config(text=final_message, wraplength=450)
-            overall_var.set(i + 1 if not self.download_cancelled and successful_downloads else i)
+            overall_var.set(finished[0] if not self.download_cancelled else len(successful_downloads))
             current_var.set(100)
             
             cancel_btn.config(text="Close", state=tk.NORMAL, command=progress_window.destroy)
@@ -455,11 +689,57 @@ class WebCrawlerGUI:
             self.status_var.set(f"Download complete. Success: {len(successful_downloads)}, Failed: {len(failed_downloads)}")
             progress_window.grab_release()
 
-        self.root.after(0, on_complete)
+        self.ui.call(on_complete)
+
+    def show_stats(self):
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("Crawl Stats")
+        window.geometry("560x420")
+        self.stats_window = window
 
-class OperationCanceledError(Exception): pass
+        text = tk.Text(window, font=("Courier", 10), wrap=tk.NONE, state=tk.DISABLED)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 0))
+        button_frame = ttk.Frame(window)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="Export JSON", command=lambda: self.export_metrics('json')).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Export Prometheus", command=lambda: self.export_metrics('prometheus')).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=window.destroy).pack(side=tk.RIGHT, padx=5)
+
+        previous = [None]
+        def refresh():
+            if not window.winfo_exists():
+                return
+            if self.metrics is None:
+                content = "No metrics collected.\nTick \"Collect metrics\" and start a crawl."
+                previous[0] = None
+            else:
+                snapshot = self.metrics.snapshot()
+                content = format_summary(snapshot, previous[0])
+                previous[0] = snapshot
+            text.config(state=tk.NORMAL)
+            text.delete('1.0', tk.END)
+            text.insert('1.0', content)
+            text.config(state=tk.DISABLED)
+            window.after(1000, refresh)
+        refresh()
+
+    def export_metrics(self, fmt):
+        if self.metrics is None:
+            messagebox.showinfo("Export", "There are no metrics to export yet.")
+            return
+        extension = '.json' if fmt == 'json' else '.prom'
+        path = filedialog.asksaveasfilename(defaultextension=extension, initialfile=f"crawl_metrics{extension}", title="Export metrics")
+        if not path:
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.metrics.to_json() if fmt == 'json' else self.metrics.to_prometheus())
+        self.status_var.set(f"Metrics exported to {path}")
 
 def main():
+    multiprocessing.freeze_support()  # The parse pool needs this in frozen builds
     root = tk.Tk()
     app = WebCrawlerGUI(root)
     root.mainloop()
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Upper bounds in seconds, Prometheus style; the last bucket catches everything slower
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# connect covers DNS resolution as well: urllib3 resolves and connects in one call
+PHASES = ('connect', 'tls', 'ttfb', 'transfer', 'parse', 'fetch', 'ui_update', 'download_ttfb')
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+
+class CrawlMetrics:
+    # Thread-safe counters, gauges and per-phase latency histograms for the crawl and download paths.
+    # Callers hold None instead of an instance when metrics are switched off, so the hot path
+    # pays nothing but an attribute check.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.histograms = {phase: Histogram() for phase in PHASES}
+        self.counters = {'pages': 0, 'bytes': 0, 'download_bytes': 0, 'errors': 0}
+        self.statuses = {}
+        self.error_types = {}
+        self.gauges = {'queue_depth': 0, 'in_flight': 0, 'parse_backlog': 0}
+
+    def observe(self, phase, seconds):
+        with self.lock:
+            self.histograms[phase].observe(seconds)
+
+    def add(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def record_status(self, status):
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status >= 400:
+                self.counters['errors'] += 1
+
+    def record_error(self, error):
+        name = type(error).__name__
+        with self.lock:
+            self.error_types[name] = self.error_types.get(name, 0) + 1
+            self.counters['errors'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'elapsed': time.monotonic() - self.started,
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+                'error_types': dict(self.error_types),
+                'phases': {
+                    phase: {
+                        'count': h.count,
+                        'sum': h.total,
+                        'p50': h.quantile(0.5),
+                        'p90': h.quantile(0.9),
+                        'p99': h.quantile(0.99),
+                        'buckets': list(h.counts),
+                    }
+                    for phase, h in self.histograms.items()
+                },
+            }
+
+    def to_json(self):
+        snapshot = self.snapshot()
+        snapshot['bucket_bounds'] = [str(bound) for bound in BUCKETS]
+        return json.dumps(snapshot, indent=2)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot['counters'].items():
+            lines.append(f"# TYPE webcrawler_{name}_total counter")
+            lines.append(f"webcrawler_{name}_total {value}")
+        for name, value in snapshot['gauges'].items():
+            lines.append(f"# TYPE webcrawler_{name} gauge")
+            lines.append(f"webcrawler_{name} {value}")
+        lines.append("# TYPE webcrawler_responses_total counter")
+        for status, count in snapshot['statuses'].items():
+            lines.append(f'webcrawler_responses_total{{status="{status}"}} {count}')
+        lines.append("# TYPE webcrawler_request_errors_total counter")
+        for error_type, count in snapshot['error_types'].items():
+            lines.append(f'webcrawler_request_errors_total{{type="{error_type}"}} {count}')
+        lines.append("# TYPE webcrawler_phase_seconds histogram")
+        for phase, data in snapshot['phases'].items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS, data['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'webcrawler_phase_seconds_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+            lines.append(f'webcrawler_phase_seconds_sum{{phase="{phase}"}} {data["sum"]}')
+            lines.append(f'webcrawler_phase_seconds_count{{phase="{phase}"}} {data["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_summary(snapshot, previous=None):
+    # Human readable panel text; rates are taken over the interval since the previous snapshot
+    counters = snapshot['counters']
+    if previous is not None and snapshot['elapsed'] > previous['elapsed']:
+        interval = snapshot['elapsed'] - previous['elapsed']
+        base = previous['counters']
+    else:
+        interval = snapshot['elapsed'] or 1.0
+        base = dict.fromkeys(counters, 0)
+    pages_rate = (counters['pages'] - base['pages']) / interval
+    bytes_rate = (counters['bytes'] - base['bytes']) / interval
+    download_rate = (counters['download_bytes'] - base['download_bytes']) / interval
+
+    gauges = snapshot['gauges']
+    lines = [
+        f"Elapsed: {snapshot['elapsed']:.0f}s   Pages: {counters['pages']}   Errors: {counters['errors']}",
+        f"Pages/sec: {pages_rate:.1f}   Crawl KB/sec: {bytes_rate / 1024:.1f}   Download KB/sec: {download_rate / 1024:.1f}",
+        f"Queue: {gauges['queue_depth']}   In flight: {gauges['in_flight']}   Parse backlog: {gauges['parse_backlog']}",
+        "",
+        f"{'Phase':<14}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}",
+    ]
+    for phase, data in snapshot['phases'].items():
+        if data['count']:
+            lines.append(f"{phase:<14}{data['count']:>8}{data['p50'] * 1000:>10.1f}{data['p90'] * 1000:>10.1f}{data['p99'] * 1000:>10.1f}")
+    if snapshot['statuses']:
+        lines.append("")
+        lines.append("Status: " + ", ".join(f"{status}={count}" for status, count in snapshot['statuses'].items()))
+    if snapshot['error_types']:
+        lines.append("Errors: " + ", ".join(f"{name}={count}" for name, count in snapshot['error_types'].items()))
+    return '\n'.join(lines)
+
+
+class _TimedConnectionMixin:
+    metrics = None
+    connect_time = 0.0
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        self.connect_time = time.perf_counter() - start
+        self.metrics.observe('connect', self.connect_time)
+        return sock
+
+
+class _TimedHTTPSConnectionMixin(_TimedConnectionMixin):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        # connect() opens the socket through _new_conn and then does the TLS handshake
+        self.metrics.observe('tls', max(0.0, time.perf_counter() - start - self.connect_time))
+
+
+def instrument_session(session, metrics):
+    # Swaps the connection classes behind the session's adapters for ones that time
+    # connection setup and the TLS handshake
+    http_connection = type('TimedHTTPConnection', (_TimedConnectionMixin, HTTPConnection), {'metrics': metrics})
+    https_connection = type('TimedHTTPSConnection', (_TimedHTTPSConnectionMixin, HTTPSConnection), {'metrics': metrics})
+    pool_classes = {
+        'http': type('TimedHTTPConnectionPool', (HTTPConnectionPool,), {'ConnectionCls': http_connection}),
+        'https': type('TimedHTTPSConnectionPool', (HTTPSConnectionPool,), {'ConnectionCls': https_connection}),
+    }
+    for adapter in set(session.adapters.values()):
+        adapter.poolmanager.pool_classes_by_scheme = pool_classes
+    return session
@@ -0,0 +1,107 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+from frontier import TRACKING_PARAMS, canonicalize_url
+from link_extractor import DEFAULT_EXTRACTOR, get_extractor
+from traps import content_fingerprint
+
+_worker = {}
+
+
+def _init_worker(extractor_name, base_url, strip_params, fingerprint_content):
+    _worker['extractor'] = get_extractor(extractor_name)
+    _worker['fingerprint_content'] = fingerprint_content
+    _worker['host'] = urlsplit(base_url).netloc
+    _worker['strip_params'] = strip_params
+
+
+def _parse_batch(batch):
+    # Runs in a worker process; only the canonical, same-host outlinks of each page travel back,
+    # with the time spent on each page, when asked for its content fingerprint, and the error
+    # if the page could not be parsed
+    extractor, host, strip_params = _worker['extractor'], _worker['host'], _worker['strip_params']
+    fingerprint_content = _worker['fingerprint_content']
+    results = []
+    for url, body, encoding in batch:
+        start = time.perf_counter()
+        seen = set()
+        links = []
+        try:
+            for link in extractor.extract(url, body, encoding):
+                link = canonicalize_url(link, strip_params)
+                if link not in seen and urlsplit(link).netloc == host:
+                    seen.add(link)
+                    links.append(link)
+            fingerprint = content_fingerprint(body, encoding) if fingerprint_content else None
+        except Exception as e:
+            results.append(([], time.perf_counter() - start, None, str(e)))
+            continue
+        results.append((links, time.perf_counter() - start, fingerprint, None))
+    return results
+
+
+class ParsePool:
+    # Parses HTML in worker processes so link extraction is not bound to the GIL. Pages are sent
+    # in batches to amortise pickling, and at most max_in_flight batches are outstanding; callers
+    # should stop fetching while full() is true. Use from a single thread.
+    def __init__(self, base_url, workers, extractor=DEFAULT_EXTRACTOR, strip_params=TRACKING_PARAMS,
+                 batch_size=16, max_in_flight=None, metrics=None, fingerprint_content=False):
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(extractor, base_url, frozenset(strip_params), fingerprint_content)
+        )
+        self.batch = []
+        self.in_flight = {}  # future -> tokens of the pages in that batch
+        self.metrics = metrics
+
+    def __len__(self):
+        return len(self.batch) + sum(len(tokens) for tokens in self.in_flight.values())
+
+    def add(self, token, url, body, encoding):
+        self.batch.append((token, url, body, encoding))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        future = self.executor.submit(_parse_batch, [(url, body, encoding) for _, url, body, encoding in self.batch])
+        self.in_flight[future] = [token for token, _, _, _ in self.batch]
+        self.batch = []
+
+    def idle(self):
+        return len(self.in_flight) < self.workers
+
+    def full(self):
+        return len(self.in_flight) >= self.max_in_flight
+
+    def futures(self):
+        return list(self.in_flight)
+
+    def collect(self, done):
+        # Yields (token, links, fingerprint, error) for every page in the finished batches;
+        # error is None unless the page, or its whole batch, could not be parsed
+        for future in done:
+            tokens = self.in_flight.pop(future, None)
+            if tokens is None:
+                continue
+            try:
+                results = future.result()
+            except Exception as e:
+                if self.metrics is not None:
+                    self.metrics.record_error(e)
+                for token in tokens:
+                    yield token, [], None, str(e) or type(e).__name__
+                continue
+            for token, (links, elapsed, fingerprint, error) in zip(tokens, results):
+                if self.metrics is not None:
+                    self.metrics.observe('parse', elapsed)
+                yield token, links, fingerprint, error
+
+    def shutdown(self):
+        # Waits for the processes to exit; a worker process of a distributed crawl that left them
+        # running would hang at exit until its coordinator terminated it, orphaning them
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,194 @@
+import math
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    # Exponential backoff with jitter so retries from many workers do not line up
+    return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+
+class RobotRules(RobotFileParser):
+    # RobotFileParser ignores a Crawl-delay that is not a whole number, like 0.5; those are read
+    # here, with the same choice of group: the first one naming the agent, else the '*' one
+    def __init__(self, url=''):
+        super().__init__(url)
+        self.delays = []  # (user agents of a group, its Crawl-delay or None)
+
+    def parse(self, lines):
+        lines = list(lines)
+        agents, delay, in_rules = [], None, False
+        for line in lines:
+            key, _, value = line.split('#', 1)[0].partition(':')
+            key, value = key.strip().lower(), value.strip()
+            if key == 'user-agent':
+                if in_rules:
+                    self.delays.append((agents, delay))
+                    agents, delay, in_rules = [], None, False
+                agents.append(value.lower())
+            elif key in ('allow', 'disallow', 'crawl-delay', 'request-rate'):
+                in_rules = True
+                if key == 'crawl-delay':
+                    try:
+                        delay = float(value) if math.isfinite(float(value)) else delay
+                    except ValueError:
+                        pass
+        if agents:
+            self.delays.append((agents, delay))
+        super().parse(lines)
+
+    def crawl_delay(self, useragent):
+        delay = super().crawl_delay(useragent)
+        if delay is not None:
+            return delay
+        name = useragent.split('/')[0].lower()
+        for agents, delay in self.delays:
+            if any(agent != '*' and agent in name for agent in agents):
+                return delay
+        for agents, delay in self.delays:
+            if '*' in agents:
+                return delay
+        return None
+
+
+class HostState:
+    __slots__ = ('robots', 'robots_lock', 'crawl_delay', 'limit', 'active', 'rate', 'tokens', 'updated',
+                 'blocked_until', 'latency', 'successes')
+
+    def __init__(self, limit, rate):
+        self.robots = None
+        self.robots_lock = threading.Lock()
+        self.crawl_delay = None
+        self.limit = limit
+        self.active = 0
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.latency = None
+        self.successes = 0
+
+
+class HostScheduler:
+    # Decides when a host may be sent another request. Each host has a token bucket for its
+    # request rate and a concurrency limit, both adjusted from observed latency and errors:
+    # they grow while responses stay fast and are halved on 429/5xx/timeouts. robots.txt is
+    # fetched once per host and its Crawl-delay caps the rate.
+    # share is the fraction of each host's limits this scheduler may use, when several processes
+    # crawl the same hosts; it can't take concurrency below one request per process.
+    # ready/acquire/release/record are called from the dispatcher thread only; allowed() runs on workers.
+    def __init__(self, session, user_agent, per_host_limit=4, rate=10.0, min_rate=0.2, max_rate=200.0,
+                 target_latency=1.0, respect_robots=True, share=1.0):
+        self.session = session
+        self.user_agent = user_agent
+        self.max_limit = max(1, int(per_host_limit * share))
+        self.initial_rate = rate * share
+        self.min_rate = min_rate * share
+        self.max_rate = max_rate * share
+        self.share = share
+        self.target_latency = target_latency
+        self.respect_robots = respect_robots
+        self.hosts = {}
+
+    def state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts.setdefault(host, HostState(max(1, self.max_limit // 2), self.initial_rate))
+        return state
+
+    def ready(self, host):
+        state = self.state(host)
+        now = time.monotonic()
+        if now < state.blocked_until or state.active >= state.limit:
+            return False
+        rate = state.rate if state.crawl_delay is None else min(state.rate, 1.0 / state.crawl_delay)
+        state.tokens = min(max(1.0, rate), state.tokens + (now - state.updated) * rate)
+        state.updated = now
+        return state.tokens >= 1.0
+
+    def acquire(self, host):
+        state = self.state(host)
+        state.active += 1
+        state.tokens -= 1.0
+
+    def release(self, host):
+        self.state(host).active -= 1
+
+    def record(self, host, latency, status):
+        # status is None when the request failed without a response
+        state = self.state(host)
+        if status is None or status in RETRY_STATUSES:
+            state.limit = max(1, state.limit // 2)
+            state.rate = max(self.min_rate, state.rate / 2)
+            state.successes = 0
+            return
+
+        state.latency = latency if state.latency is None else state.latency * 0.8 + latency * 0.2
+        if state.latency > self.target_latency * 2:
+            # Host is slowing down under load, ease off before it starts failing
+            state.limit = max(1, state.limit - 1)
+            state.successes = 0
+        elif state.latency < self.target_latency:
+            state.successes += 1
+            if state.successes >= state.limit:
+                state.limit = min(self.max_limit, state.limit + 1)
+                state.rate = min(self.max_rate, state.rate * 1.5)
+                state.successes = 0
+        if state.crawl_delay is not None:
+            state.limit = 1
+
+    def block(self, host, delay):
+        state = self.state(host)
+        state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+
+    def allowed(self, url):
+        if not self.respect_robots:
+            return True
+        parts = urlsplit(url)
+        scheme, host = parts.scheme, parts.netloc
+        state = self.state(host)
+        if state.robots is None:
+            with state.robots_lock:
+                if state.robots is None:
+                    state.robots = self.fetch_robots(scheme, host)
+                    delay = state.robots.crawl_delay(self.user_agent)
+                    if delay and delay > 0:
+                        state.crawl_delay = float(delay) / self.share
+        return state.robots.can_fetch(self.user_agent, url)
+
+    def fetch_robots(self, scheme, host):
+        parser = RobotRules(f"{scheme}://{host}/robots.txt")
+        try:
+            response = self.session.get(parser.url, timeout=10)
+        except requests.RequestException:
+            parser.allow_all = True
+            return parser
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        return parser
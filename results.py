@@ -0,0 +1,93 @@
+from array import array
+from heapq import merge
+
+# Kept in alphabetical order so sorting by type code matches sorting by name
+FILE_TYPES = ['CSS', 'Error', 'HTML', 'Image', 'JavaScript', 'Other', 'PDF', 'Skipped']
+_TYPE_CODES = {name: code for code, name in enumerate(FILE_TYPES)}
+# Rows whose URL was never fetched successfully, or deliberately not fetched at all
+NOT_DOWNLOADABLE = frozenset({'Error', 'Skipped'})
+
+
+def classify(content_type):
+    file_type = "Other"
+    if 'text/html' in content_type: file_type = "HTML"
+    elif 'image/' in content_type: file_type = "Image"
+    elif 'text/css' in content_type: file_type = "CSS"
+    elif 'javascript' in content_type: file_type = "JavaScript"
+    elif 'application/pdf' in content_type: file_type = "PDF"
+    elif 'Error:' in content_type: file_type = "Error"
+    elif content_type.startswith('Skipped:'): file_type = "Skipped"
+    return file_type
+
+
+class ResultModel:
+    # Column-oriented store for crawl results. Rows are addressed by their insertion index,
+    # which views use as a stable id; sorts and filters only ever produce lists of row indices.
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.urls = []
+        self.types = bytearray()
+        self.sizes = array('q')
+        self.content_types = []
+        self.notes = {}  # row -> why it was skipped or its links not followed, only for the few rows that have one
+        self.index = {}  # url -> row
+        self.interned = {}  # Content types repeat heavily, keep one copy of each
+        self.sort_indexes = {}  # column -> rows sorted by that column, covering the first len() rows
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def add(self, url, content_type, size, note=None):
+        # Returns the new row, or None if the URL is already listed
+        if url in self.index:
+            return None
+        row = len(self.urls)
+        self.index[url] = row
+        self.urls.append(url)
+        self.types.append(_TYPE_CODES[classify(content_type)])
+        self.sizes.append(size)
+        self.content_types.append(self.interned.setdefault(content_type, content_type))
+        if note:
+            self.notes[row] = note
+        return row
+
+    def row(self, row):
+        return self.urls[row], FILE_TYPES[self.types[row]], self.sizes[row]
+
+    def note(self, row):
+        return self.notes.get(row, '')
+
+    def file_type(self, row):
+        return FILE_TYPES[self.types[row]]
+
+    def sorted_rows(self, column):
+        key = self.types.__getitem__ if column == 'Type' else self.sizes.__getitem__
+        rows = self.sort_indexes.get(column, [])
+        if len(rows) < len(self.urls):
+            # Only rows added since the last sort need sorting, then one linear merge
+            tail = sorted(range(len(rows), len(self.urls)), key=key)
+            rows = list(merge(rows, tail, key=key)) if rows else tail
+            self.sort_indexes[column] = rows
+        return rows
+
+    def filter_rows(self, rows, file_type=None, min_size=None, max_size=None, text=None):
+        # One narrowing pass per condition, cheapest first; plain comprehensions keep 500k rows interactive
+        types, sizes, urls = self.types, self.sizes, self.urls
+        source = rows
+        if file_type is not None:
+            code = _TYPE_CODES[file_type]
+            rows = [r for r in rows if types[r] == code]
+        if min_size is not None:
+            rows = [r for r in rows if sizes[r] >= min_size]
+        if max_size is not None:
+            rows = [r for r in rows if sizes[r] <= max_size]
+        if text:
+            text = text.lower()
+            rows = [r for r in rows if text in urls[r].lower()]
+        # Always a new list: the caller may append to it, and rows may be a cached sort index
+        return list(rows) if rows is source else rows
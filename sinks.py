@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import time
+
+from results import classify
+
+FIELDS = ('url', 'type', 'size', 'content_type', 'status', 'depth', 'referrer', 'skipped')
+FORMATS = ('jsonl', 'csv', 'sqlite')
+EXTENSIONS = {'.jsonl': 'jsonl', '.json': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv', '.db': 'sqlite', '.sqlite': 'sqlite', '.sqlite3': 'sqlite'}
+
+
+def record_values(record):
+    return (record.url, classify(record.content_type), record.size, record.content_type, record.status,
+            record.depth, record.referrer, record.skipped)
+
+
+def format_for_path(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'jsonl')
+
+
+class ResultSink:
+    # Buffers records and writes them out every batch_size records or flush_interval seconds,
+    # so a crawl of any size keeps flat memory. Use from a single thread, and pass maybe_flush
+    # as the crawl's on_tick so rows still go out while no new records arrive.
+    def __init__(self, batch_size=1000, flush_interval=2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.pending = []
+        self.count = 0
+
+    def write(self, record):
+        self.pending.append(record_values(record))
+        self.count += 1
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if self.pending:
+            self.write_rows(self.pending)
+            self.pending = []
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+
+class FileSink(ResultSink):
+    # Takes a path, or an open text file such as sys.stdout that is left open
+    def __init__(self, target, **options):
+        super().__init__(**options)
+        self.owns_file = isinstance(target, (str, os.PathLike))
+        self.file = open(target, 'w', newline='', encoding='utf-8') if self.owns_file else target
+
+    def close(self):
+        super().close()
+        if self.owns_file:
+            self.file.close()
+
+
+class JsonlSink(FileSink):
+    def write_rows(self, rows):
+        self.file.write(''.join(json.dumps(dict(zip(FIELDS, row))) + '\n' for row in rows))
+        self.file.flush()  # Lets other jobs tail the file while the crawl runs
+
+
+class CsvSink(FileSink):
+    def __init__(self, target, **options):
+        super().__init__(target, **options)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow(FIELDS)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.write(self.buffer.getvalue())
+        self.file.flush()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def close(self):
+        self.flush()
+        if self.buffer.tell():
+            self.write_rows([])  # Header of an empty crawl
+        super().close()
+
+
+def is_results_database(path):
+    # True only for a database written by SqliteSink, the one kind of file it may replace
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            columns = tuple(row[1] for row in conn.execute("PRAGMA table_info(results)"))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return tables == ['results'] and columns == FIELDS
+
+
+class SqliteSink(ResultSink):
+    def __init__(self, path, **options):
+        super().__init__(**options)
+        if os.path.exists(path) and not is_results_database(path):
+            raise ValueError(f"{path} already exists and is not a crawl results database, choose another file")
+        for stale in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(stale):
+                os.remove(stale)  # Each crawl writes a fresh database, like the text formats
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE results (url TEXT PRIMARY KEY, type TEXT, size INTEGER, content_type TEXT, "
+                          "status INTEGER, depth INTEGER, referrer TEXT, skipped TEXT)")
+
+    def write_rows(self, rows):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+
+SINKS = {'jsonl': JsonlSink, 'csv': CsvSink, 'sqlite': SqliteSink}
+
+
+def open_sink(target, fmt=None, **options):
+    # target is a path or an open text file; fmt defaults to the one matching the file extension
+    fmt = fmt or format_for_path(target)
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown output format: {fmt}. Available: {', '.join(FORMATS)}")
+    return SINKS[fmt](target, **options)
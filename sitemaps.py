@@ -0,0 +1,91 @@
+import zlib
+from urllib.parse import urljoin
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def robots_sitemaps(session, base_url):
+    # Sitemap: lines from robots.txt, plus the conventional /sitemap.xml
+    sitemaps = []
+    try:
+        response = session.get(urljoin(base_url, '/robots.txt'), timeout=10)
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                key, _, value = line.partition(':')
+                if key.strip().lower() == 'sitemap' and value.strip():
+                    sitemaps.append(urljoin(base_url, value.strip()))
+    except requests.RequestException:
+        pass
+    default = urljoin(base_url, '/sitemap.xml')
+    if default not in sitemaps:
+        sitemaps.append(default)
+    return sitemaps
+
+
+def _iter_chunks(response):
+    # Sitemaps served as .gz files arrive compressed even when requests did not decode them
+    decompressor = None
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        if decompressor is None:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b'\x1f\x8b' else False
+        yield decompressor.decompress(chunk) if decompressor else chunk
+    if decompressor:
+        yield decompressor.flush()
+
+
+def parse_sitemap(session, sitemap_url):
+    # Yields ('url', loc, lastmod) and ('sitemap', loc, lastmod) entries while the document is still
+    # downloading; finished elements are dropped straight away so memory stays flat
+    parser = XMLPullParser(events=('start', 'end'))
+    root = None
+    with session.get(sitemap_url, timeout=30, stream=True) as response:
+        if response.status_code != 200:
+            return
+        for chunk in _iter_chunks(response):
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    continue
+                kind = _local_name(element.tag)
+                if kind in ('url', 'sitemap'):
+                    loc = lastmod = None
+                    for child in element:
+                        name = _local_name(child.tag)
+                        if name == 'loc':
+                            loc = (child.text or '').strip()
+                        elif name == 'lastmod':
+                            lastmod = (child.text or '').strip() or None
+                    if loc:
+                        yield kind, loc, lastmod
+                    root.clear()
+
+
+def iter_sitemap_urls(session, sitemap_urls, max_sitemaps=1000, is_running=None):
+    # Walks sitemap indexes depth first and yields (url, lastmod) for every page listed
+    is_running = is_running or (lambda: True)
+    stack = list(reversed(sitemap_urls))
+    visited = set()
+    while stack and len(visited) < max_sitemaps and is_running():
+        sitemap_url = stack.pop()
+        if sitemap_url in visited:
+            continue
+        visited.add(sitemap_url)
+        try:
+            for kind, loc, lastmod in parse_sitemap(session, sitemap_url):
+                if kind == 'sitemap':
+                    stack.append(loc)
+                else:
+                    yield loc, lastmod
+                if not is_running():
+                    return
+        except (requests.RequestException, ParseError, zlib.error):
+            continue  # A broken sitemap only loses its own entries
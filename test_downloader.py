@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downloader import DownloadEngine, DownloadJob, OperationCanceledError, unique_save_path
+
+DATA = bytes(range(256)) * 400  # 100 KB
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    # Serves self.server.data with a strong ETag, honouring Range and If-Range like a static file server
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self, head=False):
+        server = self.server
+        server.requests.append((self.command, self.headers.get('Range'), self.headers.get('If-Range')))
+        data, etag = server.data, f'"v{server.version}"'
+        start, end = 0, len(data) - 1
+        ranged = self.headers.get('Range') and self.headers.get('If-Range', etag) == etag
+        if ranged:
+            first, _, last = self.headers['Range'].removeprefix('bytes=').partition('-')
+            start, end = int(first), min(int(last) if last else len(data) - 1, len(data) - 1)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        body = data[start:end + 1]
+        self.send_response(206 if ranged else 200)
+        if ranged:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.data, httpd.version, httpd.requests = DATA, 1, []
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/file.bin"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def download(job, **options):
+    successful, failed = DownloadEngine(**dict(dict(segments=1), **options)).download_all([job])
+    assert not failed, failed[0].error
+    with open(job.save_path, 'rb') as f:
+        return f.read()
+
+
+def leftovers(job):
+    return [path for path in (job.part_path, job.state_path) if os.path.exists(path)]
+
+
+def test_download(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    assert download(job) == DATA
+    assert job.downloaded == job.total == len(DATA)
+    assert leftovers(job) == []
+
+
+def test_resume_sends_range_and_validator(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    (tmp_path / 'file.bin.part').write_bytes(DATA[:30000])
+    (tmp_path / 'file.bin.part.json').write_text(json.dumps({'validator': '"v1"'}))
+    assert download(job) == DATA
+    assert server.requests == [('GET', 'bytes=30000-', '"v1"')]
+    assert leftovers(job) == []
+
+
+def test_changed_file_starts_over(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    (tmp_path / 'file.bin.part').write_bytes(b'x' * 30000)
+    (tmp_path / 'file.bin.part.json').write_text(json.dumps({'validator': '"v0"'}))
+    assert download(job) == DATA
+
+
+def test_part_without_validator_starts_over(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    (tmp_path / 'file.bin.part').write_bytes(b'x' * 30000)
+    assert download(job) == DATA
+    assert server.requests == [('GET', None, None)]
+
+
+def test_complete_part_finishes_on_416(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    (tmp_path / 'file.bin.part').write_bytes(DATA)
+    (tmp_path / 'file.bin.part.json').write_text(json.dumps({'validator': '"v1"'}))
+    assert download(job) == DATA
+    assert leftovers(job) == []
+
+
+def test_segmented_download(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    assert download(job, segments=4, segment_threshold=1000) == DATA
+    assert sorted(r for _, r, _ in server.requests if r) == sorted(
+        f'bytes={start}-{min(start + 25600, len(DATA)) - 1}' for start in range(0, len(DATA), 25600))
+    assert leftovers(job) == []
+
+
+def test_segmented_resume_fetches_only_what_is_missing(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    part = bytearray(len(DATA))
+    part[:25600] = DATA[:25600]
+    part[25600:26600] = DATA[25600:26600]
+    (tmp_path / 'file.bin.part').write_bytes(bytes(part))
+    segments = [[0, 25599, 25600], [25600, 51199, 1000], [51200, 76799, 0], [76800, 102399, 0]]
+    (tmp_path / 'file.bin.part.json').write_text(json.dumps({'validator': '"v1"', 'total': len(DATA), 'segments': segments}))
+    assert download(job, segments=4, segment_threshold=1000) == DATA
+    assert sorted(r for method, r, _ in server.requests if method == 'GET') == [
+        'bytes=26600-51199', 'bytes=51200-76799', 'bytes=76800-102399']
+
+
+def test_segmented_resume_of_changed_file_starts_over(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    (tmp_path / 'file.bin.part').write_bytes(b'x' * len(DATA))
+    segments = [[0, 51199, 51200], [51200, 102399, 0]]
+    (tmp_path / 'file.bin.part.json').write_text(json.dumps({'validator': '"v0"', 'total': len(DATA), 'segments': segments}))
+    assert download(job, segments=4, segment_threshold=1000) == DATA
+
+
+def test_cancel_keeps_the_part(server, tmp_path):
+    job = DownloadJob(server.url, str(tmp_path / 'file.bin'))
+    engine = DownloadEngine(segments=1, is_cancelled=lambda: job.downloaded > 0)
+    successful, failed = engine.download_all([job])
+    assert isinstance(failed[0].error, OperationCanceledError)
+    assert not os.path.exists(job.save_path)
+    assert json.loads(open(job.state_path).read()) == {'validator': '"v1"'}
+    assert download(job) == DATA
+
+
+def test_unique_save_path(tmp_path):
+    (tmp_path / 'a.png').write_bytes(b'')
+    taken = set()
+    first = unique_save_path(str(tmp_path), 'a.png', taken)
+    second = unique_save_path(str(tmp_path), 'a.png', taken)
+    assert first != second
+    assert not os.path.exists(first)
+    assert unique_save_path(str(tmp_path), 'b.png', taken) == str(tmp_path / 'b.png')
@@ -0,0 +1,97 @@
+import pytest
+
+from frontier import BloomFilter, FingerprintSet, Frontier, canonicalize_url, fingerprint, remove_dot_segments
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTP://Example.COM/a', 'http://example.com/a'),
+    ('http://example.com', 'http://example.com/'),
+    ('http://example.com:80/a', 'http://example.com/a'),
+    ('https://example.com:443/a', 'https://example.com/a'),
+    ('http://example.com:8080/a', 'http://example.com:8080/a'),
+    ('http://example.com./a', 'http://example.com/a'),
+    ('http://example.com/a#section', 'http://example.com/a'),
+    ('http://example.com/a/./b/../c', 'http://example.com/a/c'),
+    ('http://example.com/a%2fb', 'http://example.com/a%2Fb'),
+    ('http://example.com/?b=2&a=1', 'http://example.com/?a=1&b=2'),
+    ('http://example.com/?utm_source=x&id=3&fbclid=y', 'http://example.com/?id=3'),
+    ('http://example.com/?utm_source=x', 'http://example.com/'),
+    ('http://example.com/cart;jsessionid=ABC', 'http://example.com/cart;jsessionid=ABC'),
+    ('http://user:pw@Example.com/', 'http://user:pw@example.com/'),
+    ('http://[::1]:8080/', 'http://[::1]:8080/'),
+    ('mailto:someone@example.com', 'mailto:someone@example.com'),
+    ('http://example.com:bad/', 'http://example.com:bad/'),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test_canonicalize_strips_given_path_params():
+    assert canonicalize_url('http://example.com/cart;jsessionid=ABC;v=1', {'jsessionid'}) == 'http://example.com/cart;v=1'
+
+
+def test_remove_dot_segments():
+    assert remove_dot_segments('/a/b/c/./../../g') == '/a/g'
+    assert remove_dot_segments('/../a') == '/a'
+    assert remove_dot_segments('/a/b/..') == '/a/'
+
+
+def test_fingerprint_never_zero():
+    assert fingerprint('http://example.com/') != 0
+    assert fingerprint('http://example.com/') == fingerprint('http://example.com/')
+
+
+def test_fingerprint_set_grows_and_keeps_members():
+    fps = FingerprintSet(capacity=16)
+    values = [fingerprint(f"http://example.com/{i}") for i in range(5000)]
+    assert all(fps.add(fp) for fp in values)
+    assert not any(fps.add(fp) for fp in values)
+    assert len(fps) == 5000
+    assert all(fp in fps for fp in values)
+    assert fingerprint('http://example.com/other') not in fps
+    assert sorted(fps) == sorted(values)
+
+
+def test_fingerprint_set_collisions_in_one_slot():
+    fps = FingerprintSet(capacity=16)
+    size = len(fps.slots)
+    colliding = [1 + i * size for i in range(5)]  # Same slot, found by probing
+    for fp in colliding:
+        assert fps.add(fp)
+    assert all(fp in fps for fp in colliding)
+    assert 1 + 5 * size not in fps
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    values = [fingerprint(f"http://example.com/{i}") for i in range(1000)]
+    for fp in values:
+        bloom.add(fp)
+    assert all(fp in bloom for fp in values)
+    false_positives = sum(fingerprint(f"http://example.org/{i}") in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_frontier_dedups_and_round_robins_hosts():
+    frontier = Frontier()
+    for url in ('http://a.com/1', 'http://a.com/2', 'http://b.com/1', 'http://a.com/1'):
+        frontier.add(url)
+    assert len(frontier) == 3
+    assert [frontier.pop()[0] for _ in range(3)] == ['http://a.com/1', 'http://b.com/1', 'http://a.com/2']
+    assert frontier.pop() is None
+    assert len(frontier) == 0
+
+
+def test_frontier_keeps_depth_and_referrer():
+    frontier = Frontier()
+    frontier.push('http://a.com/2', 3, 'http://a.com/1')
+    assert frontier.pop() == ('http://a.com/2', 3, 'http://a.com/1')
+
+
+def test_frontier_skips_hosts_that_are_not_ready():
+    frontier = Frontier()
+    frontier.add('http://a.com/1')
+    frontier.add('http://b.com/1')
+    assert frontier.pop(lambda host: host == 'b.com')[0] == 'http://b.com/1'
+    assert frontier.pop(lambda host: host == 'b.com') is None
+    assert frontier.pop()[0] == 'http://a.com/1'
@@ -0,0 +1,147 @@
+import time
+
+from politeness import HostScheduler, RobotRules, parse_retry_after
+
+AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+def robots(text):
+    rules = RobotRules('http://example.com/robots.txt')
+    rules.parse(text.splitlines())
+    return rules
+
+
+def test_fractional_crawl_delay():
+    assert robots("User-agent: *\nCrawl-delay: 0.5\nDisallow: /private\n").crawl_delay(AGENT) == 0.5
+
+
+def test_whole_crawl_delay():
+    assert robots("User-agent: *\nCrawl-delay: 2\n").crawl_delay(AGENT) == 2
+
+
+def test_crawl_delay_of_the_group_naming_the_agent():
+    text = "User-agent: *\nCrawl-delay: 5\n\nUser-agent: mozilla\nCrawl-delay: 0.25\n"
+    assert robots(text).crawl_delay(AGENT) == 0.25
+    assert robots(text).crawl_delay('OtherBot/1.0') == 5
+
+
+def test_unusable_crawl_delay():
+    assert robots("User-agent: *\nCrawl-delay: soon\n").crawl_delay(AGENT) is None
+    assert robots("User-agent: *\nCrawl-delay: inf\n").crawl_delay(AGENT) is None
+    assert robots("User-agent: *\nDisallow: /private\n").crawl_delay(AGENT) is None
+
+
+def test_rules_still_apply():
+    rules = robots("User-agent: *\nCrawl-delay: 0.5\nDisallow: /private\n")
+    assert not rules.can_fetch(AGENT, 'http://example.com/private/a')
+    assert rules.can_fetch(AGENT, 'http://example.com/public')
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert 50 < parse_retry_after(time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 60))) <= 60
+
+
+def scheduler(**options):
+    return HostScheduler(None, AGENT, respect_robots=False, **options)
+
+
+def test_concurrency_limit():
+    s = scheduler(per_host_limit=4)
+    assert s.ready('a')
+    s.acquire('a')
+    s.state('a').tokens = 10.0
+    assert s.ready('a')
+    s.acquire('a')
+    assert not s.ready('a')  # Starts at half the limit
+    s.release('a')
+    assert s.ready('a')
+
+
+def test_token_bucket_paces_requests():
+    s = scheduler(rate=2.0)
+    assert s.ready('a')
+    s.acquire('a')
+    s.release('a')
+    assert not s.ready('a')
+    s.state('a').updated -= 0.5  # Half a second at two requests a second refills one token
+    assert s.ready('a')
+
+
+def test_crawl_delay_caps_rate():
+    s = scheduler(rate=100.0)
+    s.state('a').crawl_delay = 0.5
+    s.acquire('a')
+    s.release('a')
+    s.state('a').updated -= 0.25
+    assert not s.ready('a')
+    s.state('a').updated -= 0.25
+    assert s.ready('a')
+
+
+def test_limits_grow_while_fast_and_halve_on_errors():
+    s = scheduler(per_host_limit=4, rate=10.0)
+    state = s.state('a')
+    for _ in range(10):
+        s.record('a', 0.1, 200)
+    assert state.limit == 4
+    assert state.rate > 10.0
+    rate = state.rate
+    s.record('a', 0.1, 503)
+    assert state.limit == 2
+    assert state.rate == rate / 2
+    s.record('a', 0.1, None)
+    assert state.limit == 1
+
+
+def test_slow_responses_lower_the_limit():
+    s = scheduler(per_host_limit=8)
+    state = s.state('a')
+    assert state.limit == 4
+    s.record('a', 5.0, 200)
+    assert state.limit == 3
+
+
+def test_block():
+    s = scheduler()
+    s.block('a', 60)
+    assert not s.ready('a')
+    assert s.ready('b')
+
+
+def test_share_splits_limits():
+    s = scheduler(per_host_limit=4, rate=10.0, max_rate=200.0, share=0.25)
+    assert s.max_limit == 1
+    assert s.state('a').rate == 2.5
+    assert s.max_rate == 50.0
+    assert scheduler(per_host_limit=4, share=0.1).max_limit == 1  # Never below one request
+
+
+class RobotsSession:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+    def get(self, url, timeout=None):
+        return self
+
+
+def test_allowed_reads_robots_once_per_host():
+    s = HostScheduler(RobotsSession("User-agent: *\nCrawl-delay: 0.5\nDisallow: /private\n"), AGENT)
+    assert s.allowed('http://example.com/page')
+    assert not s.allowed('http://example.com/private/a')
+    assert s.state('example.com').crawl_delay == 0.5
+
+
+def test_shared_crawl_delay_spaces_each_scheduler_further():
+    s = HostScheduler(RobotsSession("User-agent: *\nCrawl-delay: 0.5\n"), AGENT, share=0.5)
+    s.allowed('http://example.com/')
+    assert s.state('example.com').crawl_delay == 1.0
+
+
+def test_robots_errors():
+    assert not HostScheduler(RobotsSession('', 403), AGENT).allowed('http://example.com/')
+    assert HostScheduler(RobotsSession('', 404), AGENT).allowed('http://example.com/')
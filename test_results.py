@@ -0,0 +1,71 @@
+from results import ResultModel, classify
+
+
+def make_model(sizes):
+    model = ResultModel()
+    for i, size in enumerate(sizes):
+        model.add(f"http://example.com/{i}", 'image/png', size)
+    return model
+
+
+def test_classify():
+    assert classify('text/html; charset=utf-8') == 'HTML'
+    assert classify('image/jpeg') == 'Image'
+    assert classify('Error: timed out') == 'Error'
+    assert classify('Skipped: robots.txt') == 'Skipped'
+    assert classify('application/zip') == 'Other'
+
+
+def test_add_ignores_listed_urls():
+    model = ResultModel()
+    assert model.add('http://example.com/', 'text/html', 10) == 0
+    assert model.add('http://example.com/', 'text/html', 10) is None
+    assert len(model) == 1
+    assert model.row(0) == ('http://example.com/', 'HTML', 10)
+
+
+def test_sort_merges_rows_added_since_last_sort():
+    model = make_model([10, 30, 50])
+    assert [model.sizes[r] for r in model.sorted_rows('Size')] == [10, 30, 50]
+    model.add('http://example.com/a', 'image/png', 5)
+    model.add('http://example.com/b', 'image/png', 40)
+    assert [model.sizes[r] for r in model.sorted_rows('Size')] == [5, 10, 30, 40, 50]
+
+
+def test_sort_by_type_follows_type_names():
+    model = ResultModel()
+    model.add('http://example.com/a.pdf', 'application/pdf', 1)
+    model.add('http://example.com/a.css', 'text/css', 1)
+    model.add('http://example.com/', 'text/html', 1)
+    assert [model.file_type(r) for r in model.sorted_rows('Type')] == ['CSS', 'HTML', 'PDF']
+
+
+def test_unfiltered_rows_are_a_copy_of_the_sort_index():
+    # The view appends streamed rows to what filter_rows returns, which must not touch the index
+    model = make_model([10, 30, 50])
+    view = model.filter_rows(model.sorted_rows('Size'))
+    for size in (5, 40):
+        view.append(model.add(f"http://example.com/{size}b", 'image/png', size))
+    assert [model.sizes[r] for r in model.sorted_rows('Size')] == [5, 10, 30, 40, 50]
+
+
+def test_filter_rows():
+    model = ResultModel()
+    model.add('http://example.com/', 'text/html', 100)
+    model.add('http://example.com/big.png', 'image/png', 5000)
+    model.add('http://example.com/small.png', 'image/png', 50)
+    model.add('http://example.com/Logo.PNG', 'image/png', 700)
+    rows = range(len(model))
+    assert model.filter_rows(rows, file_type='Image') == [1, 2, 3]
+    assert model.filter_rows(rows, file_type='Image', min_size=100, max_size=1000) == [3]
+    assert model.filter_rows(rows, text='logo') == [3]
+    assert model.filter_rows(rows, file_type='PDF') == []
+    assert model.filter_rows(rows) == [0, 1, 2, 3]
+
+
+def test_notes():
+    model = ResultModel()
+    model.add('http://example.com/', 'text/html', 1, note="links not followed")
+    model.add('http://example.com/a', 'text/html', 1)
+    assert model.note(0) == "links not followed"
+    assert model.note(1) == ''
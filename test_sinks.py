@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import sqlite3
+
+import pytest
+
+from crawler import CrawlRecord
+from sinks import FIELDS, format_for_path, open_sink
+
+RECORDS = [
+    CrawlRecord('http://example.com/', 'text/html; charset=utf-8', 120, 200, 0, None),
+    CrawlRecord('http://example.com/a.png', 'image/png', 5000, 200, 1, 'http://example.com/'),
+    CrawlRecord('http://example.com/cal?day=9', 'Skipped: too deep', 0, None, 101, 'http://example.com/',
+                'more than 100 links from the start page'),
+]
+
+
+def write_all(sink):
+    for record in RECORDS:
+        sink.write(record)
+    sink.close()
+
+
+def test_format_for_path():
+    assert format_for_path('out.CSV') == 'csv'
+    assert format_for_path('out.sqlite3') == 'sqlite'
+    assert format_for_path('out.ndjson') == 'jsonl'
+    assert format_for_path('out') == 'jsonl'
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        open_sink(io.StringIO(), 'xml')
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    write_all(open_sink(str(path)))
+    rows = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [row['url'] for row in rows] == [record.url for record in RECORDS]
+    assert rows[1] == {'url': 'http://example.com/a.png', 'type': 'Image', 'size': 5000, 'content_type': 'image/png',
+                       'status': 200, 'depth': 1, 'referrer': 'http://example.com/', 'skipped': None}
+    assert rows[2]['type'] == 'Skipped'
+
+
+def test_csv_to_open_file_is_left_open():
+    out = io.StringIO()
+    write_all(open_sink(out, 'csv'))
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert tuple(rows[0]) == FIELDS
+    assert [row[0] for row in rows[1:]] == [record.url for record in RECORDS]
+
+
+def test_empty_csv_has_header():
+    out = io.StringIO()
+    open_sink(out, 'csv').close()
+    assert out.getvalue().strip() == ','.join(FIELDS)
+
+
+def test_rows_are_buffered_until_batch_size(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    sink = open_sink(str(path), batch_size=2, flush_interval=3600)
+    sink.write(RECORDS[0])
+    assert path.read_text() == ''
+    sink.write(RECORDS[1])
+    assert len(path.read_text().splitlines()) == 2
+    sink.write(RECORDS[2])
+    sink.maybe_flush()
+    assert len(path.read_text().splitlines()) == 2
+    sink.close()
+    assert len(path.read_text().splitlines()) == 3
+
+
+def test_maybe_flush_after_interval(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    sink = open_sink(str(path), flush_interval=0)
+    sink.pending.append(('http://example.com/',) + (None,) * (len(FIELDS) - 1))
+    sink.maybe_flush()
+    assert len(path.read_text().splitlines()) == 1
+    sink.close()
+
+
+def test_sqlite_replaces_earlier_results(tmp_path):
+    path = str(tmp_path / 'out.db')
+    write_all(open_sink(path))
+    sink = open_sink(path)
+    sink.write(RECORDS[0])
+    sink.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT url, type, depth FROM results").fetchall() == [('http://example.com/', 'HTML', 0)]
+    conn.close()
+
+
+def test_sqlite_refuses_other_databases(tmp_path):
+    path = str(tmp_path / 'state.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE urls (url TEXT)")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError):
+        open_sink(path)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT name FROM sqlite_master").fetchall() == [('urls',)]
+    conn.close()
+
+
+def test_sqlite_refuses_other_files(tmp_path):
+    path = tmp_path / 'notes.db'
+    path.write_text("not a database")
+    with pytest.raises(ValueError):
+        open_sink(str(path))
+    assert path.read_text() == "not a database"
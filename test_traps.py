@@ -0,0 +1,81 @@
+import random
+
+from traps import TrapDetector, content_fingerprint, url_pattern
+
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def page(seed, words=2000, extra=''):
+    rng = random.Random(seed)
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return f"<html><body><p>{text}</p>{extra}<a href='/next'>next</a></body></html>".encode()
+
+
+def test_url_pattern_folds_digits_and_query_values():
+    assert url_pattern('http://example.com/cal/2024/05?day=3&view=m') == 'example.com/cal/#/#?day&view'
+    assert url_pattern('http://example.com/a?b=1&b=2') == 'example.com/a?b'
+    assert url_pattern('http://example.com/') == 'example.com/'
+
+
+def test_shape_checks():
+    traps = TrapDetector()
+    assert traps.check_url('http://example.com/a/b/c') is None
+    assert traps.check_url('http://example.com/a/b/a/b/a/b') == "path repeats 'a' 3 times"
+    assert traps.check_url('http://example.com/' + '/'.join(f"s{i}" for i in range(21))) == "path deeper than 20 segments"
+    query = '&'.join(f"p{i}=1" for i in range(11))
+    assert traps.check_url(f'http://example.com/?{query}') == "11 query parameters"
+
+
+def test_no_pattern_budget_by_default():
+    traps = TrapDetector()
+    assert all(traps.check_url(f'http://example.com/product/{i}') is None for i in range(5000))
+    assert not traps.patterns
+
+
+def test_pattern_budget():
+    traps = TrapDetector(pattern_budget=3)
+    assert [traps.check_url(f'http://example.com/cal?day={i}') for i in range(3)] == [None] * 3
+    assert traps.check_url('http://example.com/cal?day=99') == "more than 3 URLs like example.com/cal?day"
+    assert traps.check_url('http://example.com/other?day=1') is None
+
+
+def test_exact_duplicates():
+    traps = TrapDetector()
+    first = content_fingerprint(page(1))
+    assert first == content_fingerprint(page(1).replace(b'<p>', b'<p  class="x">'))  # Markup alone is ignored
+    assert traps.duplicate_of(*first) is None
+    assert traps.duplicate_of(*first) == "same content as an earlier page"
+    assert traps.duplicate_of(*content_fingerprint(page(2))) is None
+
+
+def test_near_duplicates():
+    traps = TrapDetector()
+    assert traps.duplicate_of(*content_fingerprint(page(1))) is None
+    near = content_fingerprint(page(1, extra='<p>Generated at 12:00:01 for session 8f3a</p>'))
+    assert traps.duplicate_of(*near) == "nearly the same content as an earlier page"
+    assert TrapDetector(near_duplicates=False).duplicate_of(*near) is None
+
+
+def test_different_pages_are_far_apart():
+    fingerprints = [content_fingerprint(page(seed)) for seed in range(50)]
+    traps = TrapDetector()
+    assert all(traps.duplicate_of(*fp) is None for fp in fingerprints)
+
+
+def test_links_count_as_content():
+    body = page(1)
+    assert content_fingerprint(body)[0] != content_fingerprint(body.replace(b"/next", b"/elsewhere"))[0]
+
+
+def test_small_pages_only_compare_exactly():
+    exact, simhash = content_fingerprint(b"<p>Not found</p>")
+    assert simhash is None
+    traps = TrapDetector()
+    assert traps.duplicate_of(exact, simhash) is None
+    assert traps.duplicate_of(exact, simhash) == "same content as an earlier page"
+
+
+def test_empty_page_fingerprint():
+    traps = TrapDetector()
+    assert traps.duplicate_of(0, None) is None  # 0 is FingerprintSet's empty slot, still remembered
+    assert traps.duplicate_of(0, None) == "same content as an earlier page"
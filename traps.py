@@ -0,0 +1,123 @@
+import hashlib
+import heapq
+import re
+from array import array
+from collections import Counter
+from urllib.parse import urlsplit
+
+from frontier import FingerprintSet
+from link_extractor import decode_body
+
+# Query and path parameters that only carry a session, so every visit mints new URLs for the same pages
+SESSION_PARAMS = frozenset({
+    'sid', 'sessionid', 'session_id', 'phpsessid', 'jsessionid', 'aspsessionid', 'cfid', 'cftoken', 'zenid', 'oscsid',
+})
+
+_SCRIPT_OR_STYLE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.S | re.I)
+_TAG = re.compile(r'<[^>]*>')
+_WORD = re.compile(r'\w+')
+_HREF = re.compile(r'''href\s*=\s*["']?([^"'\s>]+)''', re.I)
+_DIGITS = re.compile(r'\d+')
+
+SHINGLE_SIZE = 3
+SAMPLE_SIZE = 256  # Features that go into a SimHash, the smallest hashes of the page
+MIN_FEATURES = 32  # Smaller pages are only compared exactly, their SimHash is too noisy
+NEAR_DISTANCE = 3  # Most differing SimHash bits for two pages to count as the same content
+BANDS = 4  # NEAR_DISTANCE + 1, so near duplicates always share at least one 16-bit band
+
+
+def url_pattern(url):
+    # The shape a pattern budget counts: host and path with digits folded, plus the query's keys
+    parts = urlsplit(url)
+    keys = sorted({param.partition('=')[0] for param in parts.query.split('&') if param})
+    return parts.netloc + _DIGITS.sub('#', parts.path) + ('?' + '&'.join(keys) if keys else '')
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def content_fingerprint(body, encoding=None):
+    # Returns (exact, simhash) of the visible text plus the link targets, since two pages are only
+    # interchangeable when they also lead to the same places. exact ignores other markup and
+    # whitespace; simhash is built from a consistent sample of word shingles and links so pages
+    # that differ in a date, a session token or a sidebar still land a few bits apart.
+    # simhash is None for pages too small to compare that way.
+    html = _SCRIPT_OR_STYLE.sub(' ', decode_body(body, encoding))
+    words = _WORD.findall(_TAG.sub(' ', html).lower())
+    links = _HREF.findall(html)
+    exact = _hash64('\0'.join([' '.join(words)] + links).encode('utf-8'))
+    features = set(map(' '.join, zip(*(words[i:] for i in range(SHINGLE_SIZE)))))
+    features.update('href ' + link for link in links)
+    if len(features) < MIN_FEATURES:
+        return exact, None
+    sample = heapq.nsmallest(SAMPLE_SIZE, (_hash64(feature.encode('utf-8')) for feature in features))
+    # Column-wise bit counts over the sample, taken from the binary strings in one pass
+    half = len(sample) / 2
+    columns = zip(*(format(h, '064b') for h in sample))
+    return exact, int(''.join('1' if column.count('1') > half else '0' for column in columns), 2)
+
+
+class TrapDetector:
+    # Decides which URLs are not worth fetching and which fetched pages repeat earlier content.
+    # URL checks: the same path segment over and over (/a/b/a/b/...), very deep paths, exploding
+    # query strings, and optionally a budget of URLs per pattern (digits folded, query values
+    # dropped) against calendars and endless pagination. The budget is off by default since
+    # ordinary large sites have far more than any fixed number of /product/N pages.
+    # Pages are remembered by fingerprint only, a few dozen bytes each. Use from a single thread.
+    def __init__(self, max_repeats=2, max_segments=20, max_params=10, pattern_budget=None, near_duplicates=True):
+        self.max_repeats = max_repeats
+        self.max_segments = max_segments
+        self.max_params = max_params
+        self.pattern_budget = pattern_budget
+        self.near_duplicates = near_duplicates
+        self.patterns = Counter()
+        self.exact = FingerprintSet()  # Exact hashes of every page seen
+        self.bands = {}  # band << 16 | 16-bit value -> array of the simhashes in that bucket
+
+    def check_url(self, url):
+        # Returns why the URL should be skipped, or None
+        reason = self.check_shape(url)
+        if reason is None and self.pattern_budget:
+            reason = self.count_pattern(url_pattern(url))
+        return reason
+
+    def check_shape(self, url):
+        # The checks that only look at the URL itself, without counting it
+        parts = urlsplit(url)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        if len(segments) > self.max_segments:
+            return f"path deeper than {self.max_segments} segments"
+        if segments:
+            segment, count = Counter(segments).most_common(1)[0]
+            if count > self.max_repeats:
+                return f"path repeats '{segment}' {count} times"
+        keys = sorted({param.partition('=')[0] for param in parts.query.split('&') if param})
+        if len(keys) > self.max_params:
+            return f"{len(keys)} query parameters"
+        return None
+
+    def count_pattern(self, pattern):
+        # Counts one more URL of the pattern; returns why it is skipped once the budget is used up
+        self.patterns[pattern] += 1
+        if self.patterns[pattern] > self.pattern_budget:
+            return f"more than {self.pattern_budget} URLs like {pattern}"
+        return None
+
+    def duplicate_of(self, exact, simhash):
+        # Returns why the page repeats an earlier one, or None and remembers this page
+        if not self.exact.add(exact or 1):  # 0 marks an empty slot in FingerprintSet
+            return "same content as an earlier page"
+        if not self.near_duplicates or simhash is None:
+            return None
+        keys = [band << 16 | simhash >> (band * 16) & 0xFFFF for band in range(BANDS)]
+        for key in keys:
+            for other in self.bands.get(key, ()):
+                if (simhash ^ other).bit_count() <= NEAR_DISTANCE:
+                    return "nearly the same content as an earlier page"
+        for key in keys:
+            bucket = self.bands.get(key)
+            if bucket is None:
+                bucket = self.bands[key] = array('Q')
+            bucket.append(simhash)
+        return None